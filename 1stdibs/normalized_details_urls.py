@@ -3,7 +3,7 @@ import time
 import random
 import re
 from concurrent.futures import ThreadPoolExecutor
-from queue import Queue
+from queue import Empty, Queue
 from threading import Lock
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -12,6 +12,13 @@ from selenium.webdriver.support import expected_conditions as EC
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.driver_pool import DriverPool
+from common.http_fetch import HttpFetcher, has_required_fields
+from common.readiness import wait_for_ready
+from common.resource_blocking import BlockStats, add_selenium_logging, collect_selenium_stats, enable_selenium_blocking
 
 # --- CONFIG ---
 INPUT_CSV = "1stdibs/products_list.csv"
@@ -19,10 +26,17 @@ OUTPUT_CSV = "1stdibs/poc_1stdibs_normalized.csv"
 FAILED_CSV = "1stdibs/failed_urls.csv"
 MAX_RETRIES = 3
 NUM_THREADS = 3
-BATCH_SIZE = 30  # restart driver after this many processed by a worker
+BATCH_SIZE = 30  # recycle a driver after this many pages, only when psutil can't measure its memory
+BLOCK_RESOURCES = True  # skip images/fonts/media/trackers (spec tables only)
+SITE = "1stdibs"
+FAST_EXTRACT = True  # wait for the specs instead of scrolling the whole page
+READY_SELECTOR = '[data-tn="pdp-details"], section[data-test="item-details"]'
+HTTP_FIRST = True  # try a plain GET of the server-rendered page before Chrome
 
 lock = Lock()
 progress_lock = Lock()
+block_stats = BlockStats(SITE)
+http_fetcher = HttpFetcher(SITE, maxsize=NUM_THREADS)
 
 # Final normalized output columns (order matters!)
 FIELDNAMES = [
@@ -54,9 +68,17 @@ def init_driver():
     options.add_argument("--disable-extensions")
     options.add_argument("--no-sandbox")
     options.add_argument("--headless=new")  # comment this if you want to SEE Chrome
+    if FAST_EXTRACT:
+        options.page_load_strategy = "eager"  # return at DOMContentLoaded; readiness waits do the rest
+    if BLOCK_RESOURCES:
+        add_selenium_logging(options)
     driver = webdriver.Chrome(options=options)
+    if BLOCK_RESOURCES:
+        enable_selenium_blocking(driver, SITE)
     return driver
 
+driver_pool = DriverPool(init_driver, NUM_THREADS, max_pages=BATCH_SIZE)  # shared by workers and retry passes
+
 def scroll_page(driver):
     last_height = driver.execute_script("return document.body.scrollHeight") or 0
     step = 400
@@ -191,70 +213,95 @@ def parse_details_section(soup, title_text):
     return out
 
 # --- Scraping logic ---
+def to_result(row, normalized):
+    return {
+        "name": row.get("Title", ""),
+        "price": row.get("Price", ""),
+        "url": row["URL"],
+        "stone_type": normalized.get("stone_type", ""),
+        "stone_shape": normalized.get("stone_shape", ""),
+        "stone_clarity": normalized.get("stone_clarity", ""),
+        "stone_color": normalized.get("stone_color", ""),
+        "stone_carat_weight": normalized.get("stone_carat_weight", ""),
+        "metal_type": normalized.get("metal_type", ""),
+        "metal_color": normalized.get("metal_color", ""),
+        "gold_karat": normalized.get("gold_karat", ""),
+        "ring_size": normalized.get("ring_size", ""),
+        "category": infer_category(row),
+        "source": row.get("Source", ""),
+    }
+
+def fetch_over_http(row):
+    """Parse the server-rendered page; None (→ Chrome) when its specs aren't in the HTML."""
+    def parse(html):
+        soup = BeautifulSoup(html, "html.parser")
+        # judge the page on its own specs (container or whole page, as in Chrome): the title
+        # alone would fill metal/stone fields
+        if not has_required_fields(parse_details_section(soup, "")):
+            return None
+        return parse_details_section(soup, row.get("Title", ""))
+
+    normalized = http_fetcher.fetch(row["URL"], parse)
+    return to_result(row, normalized) if normalized else None
+
 def scrape_single_product(driver, row):
     url = row["URL"]
     title_text = row.get("Title", "")
     for attempt in range(1, MAX_RETRIES + 1):
         try:
             driver.get(url)
-            WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-            scroll_page(driver)
+            if FAST_EXTRACT:
+                # no container after the timeout (it has scrolled to the bottom by then): parse the
+                # whole page like parse_details_section does, as the scroll path always has
+                wait_for_ready(driver, READY_SELECTOR)
+            else:
+                WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+                scroll_page(driver)
 
             soup = BeautifulSoup(driver.page_source, "html.parser")
             normalized = parse_details_section(soup, title_text)
-
-            result = {
-                "name": row.get("Title", ""),
-                "price": row.get("Price", ""),
-                "url": url,
-                "stone_type": normalized.get("stone_type", ""),
-                "stone_shape": normalized.get("stone_shape", ""),
-                "stone_clarity": normalized.get("stone_clarity", ""),
-                "stone_color": normalized.get("stone_color", ""),
-                "stone_carat_weight": normalized.get("stone_carat_weight", ""),
-                "metal_type": normalized.get("metal_type", ""),
-                "metal_color": normalized.get("metal_color", ""),
-                "gold_karat": normalized.get("gold_karat", ""),
-                "ring_size": normalized.get("ring_size", ""),
-                "category": infer_category(row),
-                "source": row.get("Source", ""),
-            }
-            return result
+            return to_result(row, normalized)
 
         except Exception as e:
             print(f"❌ {url} attempt {attempt} failed: {e}")
             time.sleep(random.uniform(1, 2))
     return None
 
-def worker(queue: Queue, writer, failed_writer, pbar):
-    processed = 0
-    driver = init_driver()
-    while not queue.empty():
-        row = queue.get()
-        result = scrape_single_product(driver, row)
-
-        with lock:
-            if result:
-                writer.writerow(result)
-            else:
-                failed_writer.writerow(row)
-
-        with progress_lock:
-            pbar.update(1)
-
-        processed += 1
-        queue.task_done()
+def scrape_row(row):
+    result = fetch_over_http(row) if HTTP_FIRST else None
+    if result is None:
+        driver = driver_pool.acquire()
+        try:
+            result = scrape_single_product(driver, row)
+            if BLOCK_RESOURCES:
+                collect_selenium_stats(driver, block_stats)
+        finally:
+            driver_pool.release(driver, ok=result is not None)
+    return result
 
-        if processed % BATCH_SIZE == 0:
+def worker(queue: Queue, writer, failed_writer, pbar):
+    while True:
+        try:
+            row = queue.get_nowait()
+        except Empty:
+            return
+        try:
             try:
-                driver.quit()
-            except:
-                pass
-            driver = init_driver()
-    try:
-        driver.quit()
-    except:
-        pass
+                result = scrape_row(row)
+            except Exception as e:  # e.g. Chrome failed to start: the row is retried in the next pass
+                print(f"❌ {row.get('URL')} failed outside the page: {e}")
+                result = None
+
+            with lock:
+                if result:
+                    writer.writerow(result)
+                else:
+                    failed_writer.writerow(row)
+
+            with progress_lock:
+                pbar.update(1)
+        finally:
+            queue.task_done()  # always, or task_queue.join() would wait forever
 
 def process_csv(csv_file, output_file, failed_file):
     if not os.path.exists(csv_file) or os.path.getsize(csv_file) == 0:
@@ -287,12 +334,20 @@ def process_csv(csv_file, output_file, failed_file):
         pbar = tqdm(total=len(reader), desc=f"Processing {os.path.basename(csv_file)}", ncols=100)
 
         with ThreadPoolExecutor(max_workers=NUM_THREADS) as executor:
-            for _ in range(NUM_THREADS):
-                executor.submit(worker, task_queue, writer, failed_writer, pbar)
+            futures = [executor.submit(worker, task_queue, writer, failed_writer, pbar) for _ in range(NUM_THREADS)]
 
+        # the executor has waited for every worker: re-raise whatever killed one before join(),
+        # which would otherwise block forever on the rows it never reached
+        for future in futures:
+            future.result()
         task_queue.join()
         pbar.close()
 
+    if BLOCK_RESOURCES:
+        block_stats.summary()
+    if HTTP_FIRST:
+        http_fetcher.summary()
+
 if __name__ == "__main__":
     process_csv(INPUT_CSV, OUTPUT_CSV, FAILED_CSV)
 
@@ -305,4 +360,5 @@ if __name__ == "__main__":
             print("⚠️ Max retry attempts reached. Some URLs may still fail.")
             break
 
+    driver_pool.close()
     print(f"\n🎉 All done! Results → {OUTPUT_CSV}, remaining failed URLs → {FAILED_CSV}")
@@ -0,0 +1,217 @@
+import asyncio
+import concurrent.futures
+import time
+
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_streaming_bulk
+
+from common.backup import action_doc
+from common.bulk_indexer import RETRY_STATUSES, request_error
+from common.encoding import encode_texts
+from common.sweeper import stamp_only
+
+_DONE = object()
+
+
+def connect_async(host, user, password):
+    # needs aiohttp (pip install "elasticsearch[async]")
+    return AsyncElasticsearch(host, basic_auth=(user, password), verify_certs=False)
+
+
+class AsyncIndexSink:
+    """Encode and index offers while an asyncio scraper is still producing them.
+
+    Scrapers ``await sink.put(text, action)`` for each normalized offer. A background task
+    groups offers into batches (``encode_chunk`` offers or ``flush_seconds``, whichever comes
+    first), drops the ones whose ``content_hash`` is already indexed, encodes the rest off the
+    event loop and hands them to ``max_in_flight`` workers running ``async_streaming_bulk``.
+    Bounded queues push back on the scraper when Elasticsearch or the encoder fall behind.
+
+    ``model`` may be a ``concurrent.futures.Future`` (``open_encoder_in_background``), so
+    scraping can start before the model has loaded.
+
+    The sink never fails the scrape: a bulk request that errors out is dead-lettered, and if the
+    pipeline itself dies (e.g. the model can't load) live indexing stops and later offers are
+    only counted; the embeddings step indexes them from the CSV afterwards.
+    """
+
+    def __init__(self, es, model, batch_size=64, cache=None, encode_chunk=256, flush_seconds=5.0,
+                 max_in_flight=2, chunk_size=500, max_retries=5, skip_unchanged=True, dead_letter=None):
+        self.es = es
+        self.model = model
+        self.batch_size = batch_size
+        self.cache = cache
+        self.encode_chunk = encode_chunk
+        self.flush_seconds = flush_seconds
+        self.max_in_flight = max_in_flight
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.skip_unchanged = skip_unchanged
+        self.dead_letter = dead_letter
+
+        self.pending = asyncio.Queue(maxsize=encode_chunk * 2)
+        self.encoded = asyncio.Queue(maxsize=max_in_flight)
+        self.tasks = []
+        self.failed = None  # set to the first task error; every other task is cancelled then
+        self.skipped = 0    # offers put after live indexing stopped
+
+        self.seen_ids = []
+        self.indexed = 0
+        self.unchanged = 0
+        self.errors = []
+
+    async def __aenter__(self):
+        self.failed = asyncio.get_running_loop().create_future()
+        self.tasks = [asyncio.create_task(self._encode_loop())]
+        self.tasks += [asyncio.create_task(self._index_loop()) for _ in range(self.max_in_flight)]
+        for task in self.tasks:
+            task.add_done_callback(self._task_done)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _task_done(self, task):
+        # one dead encoder/index task would leave the others blocked on a full queue: stop them all
+        if task.cancelled() or task.exception() is None or self.failed.done():
+            return
+        self.failed.set_exception(task.exception())
+        self.failed.exception()  # reported below; don't let asyncio warn that nobody retrieved it
+        for other in self.tasks:
+            other.cancel()
+        print(f"⚠️ Live indexing stopped ({task.exception()!r}); scraping continues, "
+              f"run prepare_embeddings.py afterwards to index the rest")
+
+    async def _put_pending(self, item):
+        """``pending.put`` that raises the pipeline's error instead of waiting forever once it has failed."""
+        if self.failed.done():
+            self.failed.result()
+        put = asyncio.ensure_future(self.pending.put(item))
+        await asyncio.wait({put, self.failed}, return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            self.failed.result()
+
+    async def put(self, text, action):
+        if self.failed.done():
+            self.skipped += 1
+            return
+        self.seen_ids.append(action["_id"])
+        try:
+            await self._put_pending((text, action))
+        except Exception:  # already reported by _task_done
+            self.skipped += 1
+
+    async def close(self):
+        if not self.tasks:
+            return
+        try:
+            if not self.failed.done():
+                try:
+                    await self._put_pending(_DONE)
+                except Exception:
+                    pass
+            await asyncio.wait(self.tasks)
+        finally:
+            self.tasks = []
+            await self.es.close()
+            if self.dead_letter is not None:
+                self.dead_letter.close()
+        stopped = f", {self.skipped} not indexed after it stopped" if self.failed.done() else ""
+        print(f"✅ Live indexing: {self.indexed} offers written, {self.unchanged} unchanged, "
+              f"{len(self.errors)} failed{stopped}")
+
+    # --------------------------
+    # Encode: batch, skip unchanged, embed off the event loop
+    # --------------------------
+    async def _next_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.encode_chunk:
+            timeout = deadline - time.monotonic()
+            if batch and timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.pending.get(), timeout if batch else None)
+            except asyncio.TimeoutError:
+                break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _drop_unchanged(self, batch):
+        """``(changed items, stamp-only updates for the unchanged ones)``."""
+        by_id = {action["_id"]: (text, action) for text, action in batch}
+        index = batch[0][1]["_index"]
+        try:
+            resp = await self.es.mget(index=index, ids=list(by_id), source_includes=["content_hash"])
+        except Exception as e:
+            print(f"⚠️ Live indexing: couldn't check {len(batch)} offers for changes ({e!r}); encoding them all")
+            return batch, []
+        touched = []
+        for doc in resp["docs"]:
+            if doc.get("found") and doc["_source"].get("content_hash") == action_doc(by_id[doc["_id"]][1])["content_hash"]:
+                touched.append(stamp_only(by_id.pop(doc["_id"])[1]))
+                self.unchanged += 1
+        return list(by_id.values()), touched
+
+    async def _encode_loop(self):
+        try:
+            done = False
+            while not done:
+                batch, done = await self._next_batch()
+                touched = []  # unchanged offers only get this run's run_id/last_seen
+                if batch and self.skip_unchanged:
+                    batch, touched = await self._drop_unchanged(batch)
+                actions = []
+                if batch:
+                    if isinstance(self.model, concurrent.futures.Future):
+                        self.model = await asyncio.wrap_future(self.model)
+                    texts = [text for text, _ in batch]
+                    vectors = await asyncio.to_thread(encode_texts, self.model, texts, self.batch_size, self.cache, False)
+                    for (_, action), vector in zip(batch, vectors):
+                        action_doc(action)["embedding"] = vector.tolist()
+                        actions.append(action)
+                if actions or touched:
+                    await self.encoded.put(actions + touched)
+        finally:
+            if not self.failed.done():
+                for _ in range(self.max_in_flight):
+                    await self.encoded.put(_DONE)
+
+    # --------------------------
+    # Index: each worker keeps at most one bulk request in flight
+    # --------------------------
+    async def _index_loop(self):
+        while True:
+            actions = await self.encoded.get()
+            if actions is _DONE:
+                return
+            by_id = {action["_id"]: action for action in actions}
+            try:
+                async for ok, item in async_streaming_bulk(
+                    self.es,
+                    actions,
+                    chunk_size=self.chunk_size,
+                    max_retries=self.max_retries,
+                    retry_on_status=RETRY_STATUSES,
+                    raise_on_error=False,
+                ):
+                    _, info = next(iter(item.items()))
+                    action = by_id.pop(info["_id"], None)
+                    if ok:
+                        if action is None or "embedding" in action_doc(action):  # not a stamp-only update
+                            self.indexed += 1
+                    else:
+                        self._dead_letter(action, item)
+            except Exception as e:
+                # the whole request failed (connection error, retries exhausted): dead-letter what's left
+                print(f"⚠️ Live indexing: bulk request failed ({e!r}); dead-lettering {len(by_id)} offers")
+                for action in by_id.values():
+                    self._dead_letter(action, request_error(action, e, getattr(getattr(e, "meta", None), "status", None)))
+
+    def _dead_letter(self, action, error):
+        self.errors.append(error)
+        if self.dead_letter is not None and action is not None:
+            self.dead_letter.write(action, error)
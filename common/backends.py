@@ -0,0 +1,89 @@
+import os
+import shutil
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, concurrent exports are only avoided by exporting in the parent
+    fcntl = None
+
+BACKENDS = ("torch", "onnx-int8")
+DEFAULT_ONNX_DIR = ".cache/onnx"
+DEFAULT_QUANTIZATION = "avx2"  # also: arm64, avx512, avx512_vnni
+
+
+def cache_model_key(model_name, backend):
+    """Identifier used to key cached vectors, so torch and quantized vectors never mix."""
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def _onnx_paths(model_name):
+    quantization = os.getenv("ONNX_QUANTIZATION", DEFAULT_QUANTIZATION)
+    export_dir = os.path.join(os.getenv("ONNX_MODEL_DIR", DEFAULT_ONNX_DIR), model_name.replace("/", "__"))
+    file_suffix = f"int8_{quantization}"
+    return quantization, export_dir, file_suffix, f"onnx/model_{file_suffix}.onnx"
+
+
+def export_onnx_int8(model_name, SentenceTransformer=None):
+    """Export and quantize ``model_name`` into ONNX_MODEL_DIR unless it is already there.
+
+    Safe to call from several processes at once: the export runs under a file lock into a
+    scratch directory, and the quantized file is moved in last, so its presence means the
+    export is complete. Returns ``(export_dir, file_name)``.
+    """
+    quantization, export_dir, file_suffix, file_name = _onnx_paths(model_name)
+    if os.path.exists(os.path.join(export_dir, file_name)):
+        return export_dir, file_name
+
+    os.makedirs(os.path.dirname(export_dir) or ".", exist_ok=True)
+    with open(f"{export_dir}.lock", "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)  # released when the file is closed
+        if not os.path.exists(os.path.join(export_dir, file_name)):  # another process may have finished it
+            if SentenceTransformer is None:
+                from sentence_transformers import SentenceTransformer
+            from sentence_transformers import export_dynamic_quantized_onnx_model
+
+            print(f"Exporting {model_name} to ONNX + dynamic int8 ({quantization}) in {export_dir}...")
+            scratch = f"{export_dir}.tmp-{os.getpid()}"
+            shutil.rmtree(scratch, ignore_errors=True)
+            fp32 = SentenceTransformer(model_name, backend="onnx", device="cpu")
+            fp32.save_pretrained(scratch)
+            export_dynamic_quantized_onnx_model(fp32, quantization, scratch, file_suffix=file_suffix)
+
+            files = [os.path.relpath(os.path.join(root, name), scratch)
+                     for root, _, names in os.walk(scratch) for name in names]
+            for rel in sorted(files, key=lambda rel: rel == os.path.normpath(file_name)):
+                os.makedirs(os.path.dirname(os.path.join(export_dir, rel)), exist_ok=True)
+                os.replace(os.path.join(scratch, rel), os.path.join(export_dir, rel))
+            shutil.rmtree(scratch, ignore_errors=True)
+    return export_dir, file_name
+
+
+def _onnx_int8_model(model_name, SentenceTransformer):
+    export_dir, file_name = export_onnx_int8(model_name, SentenceTransformer)
+    return SentenceTransformer(export_dir, backend="onnx", device="cpu", model_kwargs={"file_name": file_name})
+
+
+def load_embedding_model(model_name, backend="torch"):
+    """Load ``model_name`` for CPU inference with the selected backend.
+
+    ``onnx-int8`` exports and quantizes the model once into ``ONNX_MODEL_DIR`` and reuses
+    the exported file on later runs. Both backends expose the same ``encode`` call.
+    sentence_transformers (and torch) are only imported here, so callers that never
+    encode stay cheap to start.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {BACKENDS}")
+
+    start = time.perf_counter()
+    from sentence_transformers import SentenceTransformer
+    imported = time.perf_counter()
+
+    if backend == "torch":
+        model = SentenceTransformer(model_name)
+    else:
+        model = _onnx_int8_model(model_name, SentenceTransformer)
+
+    print(f"⏱ Model ready ({backend}): import {imported - start:.1f}s, load {time.perf_counter() - imported:.1f}s")
+    return model
@@ -0,0 +1,104 @@
+import json
+import os
+
+import numpy as np
+from elasticsearch import helpers
+
+VECTOR_FORMATS = ("json", "float32", "float16")
+
+
+def action_doc(action):
+    """Return the source document inside an ``index`` or ``update`` bulk action."""
+    return action["_source"] if "_source" in action else action["doc"]
+
+
+def sidecar_path(ndjson_path):
+    """``competitor_offers.ndjson`` → ``competitor_offers.vectors.npy``."""
+    return os.path.splitext(ndjson_path)[0] + ".vectors.npy"
+
+
+# --------------------------
+# Writer
+# --------------------------
+class BackupWriter:
+    """Writes the bulk-format NDJSON backup of the actions sent to Elasticsearch.
+
+    With ``vector_format`` float32/float16 the embeddings go to a memory-mappable ``.npy``
+    sidecar instead, and each NDJSON doc carries an ``embedding_row`` offset into it.
+    """
+
+    def __init__(self, path, total, vector_format="json"):
+        if vector_format not in VECTOR_FORMATS:
+            raise ValueError(f"Unknown vector format {vector_format!r}, expected one of {VECTOR_FORMATS}")
+        if vector_format != "json" and total is None:
+            raise ValueError("A .npy vector sidecar needs the total number of actions up front")
+        self.path = path
+        self.total = total
+        self.vector_format = vector_format
+        self.vectors_path = sidecar_path(path) if vector_format != "json" else None
+        self.vectors = None
+        self.rows = 0
+        self.f = open(path, "w", encoding="utf-8")
+
+    def _sidecar(self, dim):
+        if self.vectors is None:
+            self.vectors = np.lib.format.open_memmap(
+                self.vectors_path, mode="w+", dtype=np.dtype(self.vector_format), shape=(self.total, dim)
+            )
+        return self.vectors
+
+    def write(self, action):
+        meta, data = helpers.expand_action(action)
+
+        if self.vectors_path is not None:
+            doc = action_doc(action)
+            embedding = doc["embedding"]
+            self._sidecar(len(embedding))[self.rows] = embedding
+            stripped = {k: v for k, v in doc.items() if k != "embedding"}
+            stripped["embedding_row"] = self.rows
+            data = stripped if "_source" in action else {**data, "doc": stripped}
+            self.rows += 1
+
+        self.f.write(json.dumps(meta) + "\n")
+        self.f.write(json.dumps(data) + "\n")
+
+    def close(self):
+        self.f.close()
+        if self.vectors is not None:
+            self.vectors.flush()
+            del self.vectors
+            self.vectors = None
+            print(f"💾 Wrote {self.rows} vectors to {self.vectors_path} ({self.vector_format})")
+
+
+# --------------------------
+# Loader
+# --------------------------
+def iter_backup_actions(ndjson_path, vectors_path=None):
+    """Rebuild full bulk actions (embeddings included) from an NDJSON backup.
+
+    Vectors referenced by ``embedding_row`` are read from the ``.npy`` sidecar through a
+    memory map, so the sidecar never has to fit in memory.
+    """
+    vectors = None
+
+    with open(ndjson_path, encoding="utf-8") as f:
+        for meta_line in f:
+            if not meta_line.strip():
+                continue
+            meta = json.loads(meta_line)
+            body = json.loads(next(f))
+            op_type, target = next(iter(meta.items()))
+
+            doc = body["doc"] if op_type == "update" else body
+            if "embedding_row" in doc:
+                if vectors is None:
+                    vectors = np.load(vectors_path or sidecar_path(ndjson_path), mmap_mode="r")
+                doc["embedding"] = vectors[doc.pop("embedding_row")].astype(np.float32).tolist()
+
+            action = {"_op_type": op_type, **target}
+            if op_type == "update":
+                action.update(body)
+            else:
+                action["_source"] = body
+            yield action
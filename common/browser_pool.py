@@ -0,0 +1,190 @@
+# Playwright counterpart of DriverPool: one Chromium shared by every page slot and kept across
+# the retry passes of a details script. A context is recreated when too many of its pages fail,
+# and the whole browser is relaunched when its processes grow past the memory limit.
+import asyncio
+import os
+from collections import Counter, deque
+
+from common.driver_pool import DEFAULT_MAX_ERROR_RATE, DEFAULT_MAX_RSS_MB, ERROR_WINDOW, psutil
+
+RSS_CHECK_EVERY = 20  # browser pages between memory checks
+BROWSER_PROCESS_NAMES = ("chrom", "headless_shell")
+
+
+class BrowserPool:
+    """``contexts`` browser contexts over one Chromium; page slot ``i`` always uses context ``i % contexts``.
+
+    ``page(slot)`` returns the slot's tab, moving it to a fresh context once its old one was
+    recycled; ``release(slot, ok)`` records the outcome. A context is replaced when at least
+    ``max_error_rate`` of its last ``ERROR_WINDOW`` pages failed, and the browser when its
+    Chromium processes use more than ``max_rss_mb`` (needs psutil) or it disconnected. Retired
+    contexts and browsers are closed once no slot uses them any more.
+    """
+
+    def __init__(self, playwright, contexts, setup=None, max_rss_mb=DEFAULT_MAX_RSS_MB,
+                 max_error_rate=DEFAULT_MAX_ERROR_RATE, **launch_options):
+        self.playwright = playwright
+        self.size = max(1, contexts)
+        self.setup = setup  # async callable run on every new context (resource blocking)
+        self.max_rss_mb = max_rss_mb
+        self.max_error_rate = max_error_rate
+        self.launch_options = launch_options
+        self.browser = None
+        self.contexts = []  # {"context", "browser", "outcomes", "slots", "retired"}
+        self.slots = {}     # slot -> (context entry, page)
+        self.busy = set()   # slots between page() and release()
+        self.pages_since_check = 0
+        self.launched = 0
+        self.created = 0
+        self.recycled = Counter()
+        self.lock = asyncio.Lock()  # held while contexts or the browser are being replaced
+
+    # --------------------------
+    # Browser / contexts
+    # --------------------------
+    async def launch(self):
+        """Start Chromium, or relaunch it if it died since the last pass."""
+        if self.browser is None or not self.browser.is_connected():
+            if self.browser is not None:
+                self.recycled["browser crashed"] += 1
+            await self._launch()
+        return self.browser
+
+    async def _launch(self):
+        self.browser = await self.playwright.chromium.launch(**self.launch_options)
+        self.launched += 1
+
+    async def _new_context(self):
+        context = await self.browser.new_context()
+        if self.setup is not None:
+            await self.setup(context)
+        self.created += 1
+        return {"context": context, "browser": self.browser, "outcomes": deque(maxlen=ERROR_WINDOW),
+                "slots": 0, "retired": False}
+
+    async def begin_pass(self):
+        """Fresh contexts (cookies/cache) for a pass, on the same browser process."""
+        await self.launch()
+        self.contexts = [await self._new_context() for _ in range(self.size)]
+
+    async def end_pass(self):
+        for slot in list(self.slots):
+            await self._leave(slot)
+        for entry in self.contexts:
+            await self._close_context(entry)
+        self.contexts = []
+
+    async def _close_context(self, entry):
+        try:
+            await entry["context"].close()
+        except Exception:
+            pass
+        browser = entry["browser"]
+        if browser is not self.browser and not any(e["browser"] is browser for e in self._open_entries()):
+            try:
+                await browser.close()
+            except Exception:
+                pass
+
+    def _open_entries(self):
+        entries = {id(e): e for e in self.contexts}
+        entries.update({id(entry): entry for entry, _ in self.slots.values()})
+        return list(entries.values())
+
+    async def _retire(self, index):
+        # callers hold self.lock, so page() never opens a tab in a context being replaced
+        old = self.contexts[index]
+        old["retired"] = True
+        self.contexts[index] = await self._new_context()
+        # idle tabs move now rather than on their next browser page; the last one out closes ``old``
+        idle = [slot for slot, (entry, _) in self.slots.items() if entry is old and slot not in self.busy]
+        for slot in idle:
+            await self._leave(slot)
+        if not idle and not old["slots"]:
+            await self._close_context(old)
+
+    async def _relaunch(self, reason):
+        self.recycled[reason] += 1
+        await self._launch()
+        for index in range(len(self.contexts)):
+            await self._retire(index)
+
+    # --------------------------
+    # Health / recycling
+    # --------------------------
+    def rss_mb(self):
+        """RSS of every Chromium process started by this script (current and retiring browsers)."""
+        if psutil is None:
+            return None
+        try:
+            procs = psutil.Process(os.getpid()).children(recursive=True)
+            return sum(
+                p.memory_info().rss for p in procs
+                if any(name in p.name().lower() for name in BROWSER_PROCESS_NAMES)
+            ) / 1024 / 1024
+        except Exception:
+            return None
+
+    def error_rate_exceeded(self, entry):
+        outcomes = entry["outcomes"]
+        return len(outcomes) == outcomes.maxlen and outcomes.count(False) / len(outcomes) >= self.max_error_rate
+
+    # --------------------------
+    # Page slots
+    # --------------------------
+    async def _leave(self, slot):
+        entry, page = self.slots.pop(slot)
+        try:
+            await page.close()
+        except Exception:
+            pass
+        entry["slots"] -= 1
+        if entry["retired"] and not entry["slots"]:
+            await self._close_context(entry)
+
+    async def page(self, slot):
+        async with self.lock:  # also waits out a recycle in progress
+            if not self.browser.is_connected():
+                await self._relaunch("browser crashed")
+        entry = self.contexts[slot % len(self.contexts)]
+        self.busy.add(slot)
+        if slot in self.slots:
+            if self.slots[slot][0] is entry:
+                return self.slots[slot][1]
+            await self._leave(slot)
+        entry["slots"] += 1  # before awaiting, so a recycle meanwhile doesn't close the context under us
+        try:
+            page = await entry["context"].new_page()
+        except Exception:
+            entry["slots"] -= 1
+            self.busy.discard(slot)
+            raise
+        self.slots[slot] = (entry, page)
+        return page
+
+    async def release(self, slot, ok=True):
+        self.busy.discard(slot)
+        if slot not in self.slots:  # page() itself failed
+            return
+        entry, _ = self.slots[slot]
+        entry["outcomes"].append(ok)
+        if not entry["retired"] and self.error_rate_exceeded(entry):
+            async with self.lock:
+                if not entry["retired"]:
+                    await self._retire(self.contexts.index(entry))
+                    self.recycled["context errors"] += 1
+
+        self.pages_since_check += 1
+        if self.pages_since_check >= RSS_CHECK_EVERY:
+            self.pages_since_check = 0
+            rss = self.rss_mb()
+            if rss is not None and rss > self.max_rss_mb:
+                async with self.lock:
+                    await self._relaunch("browser memory")
+
+    async def close(self):
+        await self.end_pass()
+        if self.browser is not None:
+            await self.browser.close()
+        recycled = ", ".join(f"{count} {reason}" for reason, count in self.recycled.most_common()) or "none"
+        print(f"🧰 Browser pool: {self.launched} Chromium launches, {self.created} contexts, recycled: {recycled}")
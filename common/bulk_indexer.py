@@ -0,0 +1,236 @@
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+from elasticsearch import ApiError, TransportError, helpers
+from tqdm import tqdm
+
+RETRY_STATUSES = (429, 503)  # rejected execution / node unavailable: safe to resend
+
+DEFAULT_THREADS = 4
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_TARGET_LATENCY = 1.0  # seconds per bulk request; adaptive sizing aims for 0.5x-1.5x of this
+MIN_CHUNK_SIZE = 50
+MAX_CHUNK_SIZE = 5000
+
+
+def request_error(action, exc, status=None):
+    """Bulk-item shaped error for a doc whose whole request failed (no per-item response)."""
+    op_type = action.get("_op_type", "index")
+    kind = "bulk_request_failed" if isinstance(exc, ApiError) else "bulk_connection_error"
+    return {
+        op_type: {
+            "_index": action.get("_index"),
+            "_id": action.get("_id"),
+            "status": status or 0,
+            "error": {"type": kind, "reason": f"{type(exc).__name__}: {exc}"[:500]},
+        }
+    }
+
+
+class BulkIndexer:
+    """Parallel bulk loader with per-item retries on 429/503 and exponential backoff.
+
+    Actions are serialized once, packed into chunks of at most ``chunk_size`` docs and
+    ``max_bytes`` bytes, and sent by ``threads`` workers. Chunk latency and throughput
+    are reported when ``index`` finishes.
+
+    With ``adaptive`` on, ``chunk_size`` is only the starting point: it is halved when
+    requests are rejected, scaled down when a request takes longer than the target latency
+    band, and grown by 25% when full chunks come back well inside it.
+    """
+
+    def __init__(
+        self,
+        es,
+        threads=DEFAULT_THREADS,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        max_bytes=DEFAULT_MAX_BYTES,
+        max_retries=DEFAULT_MAX_RETRIES,
+        initial_backoff=1.0,
+        max_backoff=60.0,
+        adaptive=True,
+        target_latency=DEFAULT_TARGET_LATENCY,
+        min_chunk_size=MIN_CHUNK_SIZE,
+        max_chunk_size=MAX_CHUNK_SIZE,
+        dead_letter=None,
+    ):
+        self.es = es
+        self.threads = threads
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.adaptive = adaptive
+        self.target_latency = target_latency
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.dead_letter = dead_letter  # DeadLetterQueue that keeps the full action of every failed doc
+        self.serializer = es.transport.serializers.get_serializer("application/json")
+
+        self.indexed = 0
+        self.errors = []
+        self.retries = 0
+        self.latencies = []  # (docs, bytes, seconds) per bulk request
+        self.chunk_sizes = [chunk_size]  # every size the adaptive loop settled on
+        self.rejected_at = None  # smallest chunk size that drew rejections; growth stays below it
+
+    # --------------------------
+    # Chunking
+    # --------------------------
+    def _serialize(self, action):
+        meta, data = helpers.expand_action(action)
+        lines = [self.serializer.dumps(meta)]
+        if data is not None:
+            lines.append(self.serializer.dumps(data))
+        return lines
+
+    def _chunks(self, actions):
+        chunk, size = [], 0
+        for action in actions:
+            lines = self._serialize(action)
+            action_bytes = sum(len(line) + 1 for line in lines)
+            if chunk and (len(chunk) >= self.chunk_size or size + action_bytes > self.max_bytes):
+                yield chunk
+                chunk, size = [], 0
+            chunk.append((action, lines))
+            size += action_bytes
+        if chunk:
+            yield chunk
+
+    # --------------------------
+    # Sending
+    # --------------------------
+    def _backoff(self, attempt):
+        delay = min(self.max_backoff, self.initial_backoff * 2 ** attempt)
+        time.sleep(delay * random.uniform(0.5, 1.0))  # jitter so threads don't retry in lockstep
+
+    def _send_chunk(self, chunk):
+        """Send one chunk, resending only the items rejected with a retryable status."""
+        indexed, errors, latencies, retries = 0, [], [], 0
+        pending = chunk
+
+        for attempt in range(self.max_retries + 1):
+            body = [line for _, lines in pending for line in lines]
+            start = time.perf_counter()
+            try:
+                resp = self.es.bulk(operations=body)
+            except (ApiError, TransportError) as e:
+                status = getattr(getattr(e, "meta", None), "status", None)
+                retryable = status in RETRY_STATUSES or not isinstance(e, ApiError)  # timeouts / connection errors
+                if retryable and attempt < self.max_retries:
+                    retries += 1
+                    self._backoff(attempt)
+                    continue
+                # the whole request failed: dead-letter its docs and let the other chunks carry on
+                tqdm.write(f"⚠️ Bulk request of {len(pending)} docs failed after {attempt + 1} attempts: {e}")
+                errors.extend((action, request_error(action, e, status)) for action, _ in pending)
+                break
+            latencies.append((len(pending), sum(len(line) + 1 for line in body), time.perf_counter() - start))
+
+            retry = []
+            for (action, lines), item in zip(pending, resp["items"]):
+                op_type, info = next(iter(item.items()))
+                status = info.get("status", 500)
+                if 200 <= status < 300:
+                    indexed += 1
+                elif status in RETRY_STATUSES and attempt < self.max_retries:
+                    retry.append((action, lines))
+                else:
+                    errors.append((action, {op_type: info}))
+
+            if not retry:
+                break
+            retries += len(retry)
+            pending = retry
+            self._backoff(attempt)
+
+        return indexed, errors, latencies, retries
+
+    # --------------------------
+    # Adaptive chunk sizing
+    # --------------------------
+    def _adapt(self, latencies, rejected):
+        docs, nbytes, seconds = latencies[-1]
+        old = self.chunk_size
+        if rejected:
+            self.rejected_at = min(old, self.rejected_at or old)
+            new, reason = old // 2, f"{rejected} rejected"
+        elif seconds > self.target_latency * 1.5:
+            new, reason = int(old * max(0.5, self.target_latency / seconds)), "slow"
+        elif seconds < self.target_latency * 0.5 and docs >= old * 0.9:
+            # only grow on full chunks; byte-capped or tail chunks say nothing about a bigger size
+            new, reason = int(old * 1.25), "fast"
+        else:
+            return
+
+        new = max(self.min_chunk_size, min(self.max_chunk_size, new))
+        if new > old:
+            new = min(new, max(old, int(self.max_bytes / (nbytes / docs))))
+            if self.rejected_at:
+                new = min(new, max(old, int(self.rejected_at * 0.8)))
+        if new != old:
+            self.chunk_size = new
+            self.chunk_sizes.append(new)
+            tqdm.write(
+                f"📐 Bulk chunk size {old} → {new} ({reason}: {docs} docs, "
+                f"{nbytes / 1024 / 1024:.1f} MB in {seconds:.2f}s)"
+            )
+
+    def index(self, actions, total=None):
+        """Index every action; returns ``(indexed_count, errors)`` with errors as bulk response items."""
+        start = time.perf_counter()
+        in_flight = {}  # future -> chunk size it was built with
+
+        def collect(done, pbar):
+            for future in done:
+                indexed, errors, latencies, retries = future.result()
+                self.indexed += indexed
+                for action, error in errors:
+                    self.errors.append(error)
+                    if self.dead_letter is not None:
+                        self.dead_letter.write(action, error)
+                self.latencies.extend(latencies)
+                self.retries += retries
+                pbar.update(indexed + len(errors))
+                built_with = in_flight.pop(future)
+                # chunks built before the last resize would just repeat the same signal
+                if self.adaptive and latencies and built_with == self.chunk_size:
+                    self._adapt(latencies, retries)
+
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="bulk") as pool, \
+             tqdm(total=total, desc="Indexing") as pbar:
+            for chunk in self._chunks(actions):
+                built_with = self.chunk_size
+                collect([future for future in in_flight if future.done()], pbar)
+                # bounded in-flight work keeps memory flat and applies back-pressure upstream
+                if len(in_flight) >= self.threads * 2:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done, pbar)
+                in_flight[pool.submit(self._send_chunk, chunk)] = built_with
+            done, _ = wait(in_flight)
+            collect(done, pbar)
+
+        self.report(time.perf_counter() - start)
+        return self.indexed, self.errors
+
+    def report(self, elapsed):
+        if not self.latencies:
+            return
+        seconds = np.array([s for _, _, s in self.latencies])
+        docs = sum(d for d, _, _ in self.latencies)
+        mb = sum(b for _, b, _ in self.latencies) / 1024 / 1024
+        print(
+            f"📦 {len(self.latencies)} bulk requests ({docs} docs, {mb:.1f} MB) with {self.threads} threads: "
+            f"latency p50 {np.percentile(seconds, 50):.2f}s / p95 {np.percentile(seconds, 95):.2f}s / max {seconds.max():.2f}s"
+        )
+        print(f"🚀 {self.indexed / max(elapsed, 1e-9):.1f} docs/s indexed, {self.retries} retried items, {len(self.errors)} failed")
+        if self.adaptive:
+            print(
+                f"📐 Chunk size {self.chunk_sizes[0]} → {self.chunk_size} "
+                f"(range {min(self.chunk_sizes)}-{max(self.chunk_sizes)}, {len(self.chunk_sizes) - 1} changes)"
+            )
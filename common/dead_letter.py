@@ -0,0 +1,140 @@
+# Dead-letter queue for bulk failures: full actions (source + embedding) grouped by error type,
+# so a mapping fix can be followed by re-sending just those docs, without encoding anything again.
+#   python -m common.dead_letter list <dir>
+#   python -m common.dead_letter retry-failed <dir> [--error-type mapper_parsing_exception] [--index competitor_offers]
+import argparse
+import glob
+import json
+import os
+import re
+from collections import Counter
+
+RETRYING_SUFFIX = ".retrying"
+
+
+def error_type(info):
+    error = info.get("error")
+    if isinstance(error, dict) and error.get("type"):
+        return error["type"]
+    return f"status_{info.get('status', 'unknown')}"
+
+
+class DeadLetterQueue:
+    """Appends failed bulk actions to ``<directory>/<error type>.ndjson``, one JSON record per line."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.files = {}
+        self.counts = Counter()
+
+    def write(self, action, error):
+        op_type, info = next(iter(error.items()))
+        kind = re.sub(r"[^\w.-]", "_", error_type(info))
+        if kind not in self.files:
+            os.makedirs(self.directory, exist_ok=True)
+            self.files[kind] = open(os.path.join(self.directory, f"{kind}.ndjson"), "a", encoding="utf-8")
+        record = {"error": info, "action": {**action, "_op_type": action.get("_op_type", op_type)}}
+        self.files[kind].write(json.dumps(record, default=str) + "\n")
+        self.counts[kind] += 1
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+        if self.counts:
+            summary = ", ".join(f"{count} {kind}" for kind, count in self.counts.most_common())
+            print(f"☠️ Dead-lettered {sum(self.counts.values())} docs in {self.directory}: {summary}")
+            print(f"   Fix the cause, then: python -m common.dead_letter retry-failed {self.directory}")
+
+
+def read_records(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def dead_letter_files(directory, kinds=None):
+    """Dead-letter files in ``directory``, including ones a crashed retry left behind."""
+    paths = sorted(glob.glob(os.path.join(directory, "*.ndjson")) + glob.glob(os.path.join(directory, f"*.ndjson{RETRYING_SUFFIX}")))
+    if kinds:
+        paths = [p for p in paths if os.path.basename(p).split(".ndjson")[0] in kinds]
+    return paths
+
+
+# --------------------------
+# CLI
+# --------------------------
+def list_dead_letters(directory):
+    paths = dead_letter_files(directory)
+    if not paths:
+        print(f"✅ No dead-lettered docs in {directory}")
+        return
+    for path in paths:
+        records = list(read_records(path))
+        reason = (records[0]["error"].get("error") or {}).get("reason", "") if records else ""
+        print(f"{os.path.basename(path)}: {len(records)} docs  e.g. {str(reason)[:160]}")
+
+
+def retry_failed(es, directory, kinds=None, index=None, **indexer_kwargs):
+    """Re-send dead-lettered actions; docs that fail again are written back to the queue."""
+    from common.bulk_indexer import BulkIndexer
+
+    paths = dead_letter_files(directory, kinds)
+    if not paths:
+        print(f"✅ No dead-lettered docs in {directory}")
+        return 0, []
+
+    # move the files aside first so fresh failures can be appended under the same names
+    claimed = []
+    for path in paths:
+        if not path.endswith(RETRYING_SUFFIX):
+            os.replace(path, path + RETRYING_SUFFIX)
+            path += RETRYING_SUFFIX
+        claimed.append(path)
+
+    def actions():
+        for path in claimed:
+            for record in read_records(path):
+                action = record["action"]
+                if index:
+                    action["_index"] = index
+                yield action
+
+    total = sum(1 for path in claimed for _ in read_records(path))
+    queue = DeadLetterQueue(directory)
+    indexer = BulkIndexer(es, dead_letter=queue, **indexer_kwargs)
+    try:
+        indexed, errors = indexer.index(actions(), total=total)
+    finally:
+        queue.close()
+    for path in claimed:
+        os.remove(path)
+    print(f"✅ Re-sent {indexed} of {total} dead-lettered docs")
+    return indexed, errors
+
+
+if __name__ == "__main__":
+    from common.es_index import connect
+
+    parser = argparse.ArgumentParser(description="Inspect and re-send dead-lettered bulk documents")
+    parser.add_argument("--host", default=None, help="Elasticsearch host URL (optional, fallback to .env)")
+    parser.add_argument("--user", default=None, help="Elasticsearch username (optional, fallback to .env)")
+    parser.add_argument("--password", default=None, help="Elasticsearch password (optional, fallback to .env)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    show = commands.add_parser("list", help="Count dead-lettered docs per error type")
+    show.add_argument("directory", help="Dead-letter directory (prepare_embeddings --dead-letter-dir)")
+
+    retry = commands.add_parser("retry-failed", help="Re-send dead-lettered docs as stored (no re-encoding)")
+    retry.add_argument("directory", help="Dead-letter directory (prepare_embeddings --dead-letter-dir)")
+    retry.add_argument("--error-type", action="append", default=None, help="Only retry this error type (repeatable)")
+    retry.add_argument("--index", default=None, help="Send the docs to this index instead of the one they failed on")
+    retry.add_argument("--index-threads", type=int, default=4, help="Parallel bulk requests in flight")
+
+    args = parser.parse_args()
+    if args.command == "list":
+        list_dead_letters(args.directory)
+    else:
+        es = connect(args.host, args.user, args.password)
+        retry_failed(es, args.directory, args.error_type, args.index, threads=args.index_threads)
@@ -0,0 +1,35 @@
+import hashlib
+import json
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# query parameters that never change which product a URL points at: exact names, plus every
+# utm_* campaign tag (a prefix match on the rest would also drop e.g. reference/refinement)
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "ref", "srsltid"}
+TRACKING_PREFIXES = ("utm_",)
+# bookkeeping fields that change every run without the offer changing
+UNHASHED_FIELDS = ("embedding", "content_hash", "run_id", "last_seen")
+
+
+def canonical_url(url):
+    """Lowercase scheme/host, drop fragments, tracking params and trailing slashes; sort what's left."""
+    parts = urlsplit(url.strip())
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ""))
+
+
+def offer_id(source, url, fallback=""):
+    """Deterministic doc ID from the source and canonical product URL (``fallback`` text when the URL is missing)."""
+    key = canonical_url(url) if url else f"text:{fallback}"
+    return f"{source}-{hashlib.sha1(key.encode('utf-8')).hexdigest()}"
+
+
+def content_hash(doc, model_key="", text=""):
+    """Hash of the indexed fields, the embedded ``text`` and the model, so any of them changing re-encodes the offer."""
+    fields = {key: value for key, value in doc.items() if key not in UNHASHED_FIELDS}
+    payload = json.dumps([model_key, fields, text], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
@@ -0,0 +1,140 @@
+# Selenium drivers shared by every worker thread and kept alive across the retry passes of a
+# details script. Drivers are health-checked before reuse and recycled on memory or error rate
+# instead of after a fixed number of pages.
+import queue
+import threading
+from collections import Counter, deque
+
+try:
+    import psutil
+except ImportError:  # optional: without it memory can't be measured and max_pages applies
+    psutil = None
+
+DEFAULT_MAX_RSS_MB = 1500     # chromedriver + all Chrome processes of one session
+DEFAULT_MAX_ERROR_RATE = 0.5  # over the last ERROR_WINDOW pages
+ERROR_WINDOW = 10
+
+
+class DriverPool:
+    """Up to ``size`` drivers built with ``factory()``; ``acquire``/``release`` from any thread.
+
+    A released driver is quit (and replaced on the next ``acquire``) when its process tree uses
+    more than ``max_rss_mb``, when at least ``max_error_rate`` of its last ``ERROR_WINDOW``
+    pages failed, or, only if psutil isn't installed, after ``max_pages`` pages.
+    """
+
+    def __init__(self, factory, size, max_rss_mb=DEFAULT_MAX_RSS_MB, max_error_rate=DEFAULT_MAX_ERROR_RATE,
+                 max_pages=None):
+        self.factory = factory
+        self.size = size
+        self.max_rss_mb = max_rss_mb
+        self.max_error_rate = max_error_rate
+        self.max_pages = max_pages
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.live = 0
+        self.started = 0
+        self.recycled = Counter()
+        self.state = {}  # id(driver) -> {"pages": n, "outcomes": deque}
+
+    # --------------------------
+    # Health / recycling
+    # --------------------------
+    def healthy(self, driver):
+        try:
+            return driver.execute_script("return document.readyState") is not None
+        except Exception:
+            return False
+
+    def rss_mb(self, driver):
+        if psutil is None:
+            return None
+        try:
+            root = psutil.Process(driver.service.process.pid)
+            procs = [root] + root.children(recursive=True)
+            return sum(p.memory_info().rss for p in procs) / 1024 / 1024
+        except Exception:
+            return None
+
+    def recycle_reason(self, driver):
+        state = self.state[id(driver)]
+        outcomes = state["outcomes"]
+        if len(outcomes) == outcomes.maxlen and outcomes.count(False) / len(outcomes) >= self.max_error_rate:
+            return "errors"
+        rss = self.rss_mb(driver)
+        if rss is not None and rss > self.max_rss_mb:
+            return "memory"
+        if rss is None and self.max_pages and state["pages"] >= self.max_pages:
+            return "pages"
+        return None
+
+    def _start(self):
+        driver = self.factory()
+        self.state[id(driver)] = {"pages": 0, "outcomes": deque(maxlen=ERROR_WINDOW)}
+        with self.lock:
+            self.started += 1
+        return driver
+
+    def _discard(self, driver, reason):
+        self.state.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        with self.lock:
+            self.live -= 1
+            self.recycled[reason] += 1
+
+    # --------------------------
+    # Leasing
+    # --------------------------
+    def acquire(self):
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                with self.lock:
+                    can_start = self.live < self.size
+                    if can_start:
+                        self.live += 1
+                if can_start:
+                    try:
+                        return self._start()
+                    except Exception:
+                        with self.lock:
+                            self.live -= 1
+                        raise
+                try:
+                    driver = self.idle.get(timeout=1)  # re-check: a discarded driver frees a slot
+                except queue.Empty:
+                    continue
+
+            if self.healthy(driver):
+                return driver
+            self._discard(driver, "unhealthy")
+
+    def release(self, driver, ok=True):
+        state = self.state[id(driver)]
+        state["pages"] += 1
+        state["outcomes"].append(ok)
+        reason = self.recycle_reason(driver)
+        if reason:
+            self._discard(driver, reason)
+        else:
+            self.idle.put(driver)
+
+    def close(self):
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            self.state.pop(id(driver), None)
+            try:
+                driver.quit()
+            except Exception:
+                pass
+            with self.lock:
+                self.live -= 1
+        recycled = ", ".join(f"{count} {reason}" for reason, count in self.recycled.most_common()) or "none"
+        print(f"🧰 Driver pool: {self.started} Chrome sessions started, recycled: {recycled}")
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+DEFAULT_CACHE_PATH = ".cache/embeddings.sqlite"
+DEFAULT_MAX_ENTRIES = 500_000
+
+SQLITE_MAX_PARAMS = 500  # keep IN (...) lists well under SQLite's variable limit
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Content-addressed embedding store keyed by (model name, sha256 of the canonical text).
+
+    Entries are evicted least-recently-used first once the cache holds more than
+    ``max_entries`` vectors.
+    """
+
+    def __init__(self, path=None, model_name="", max_entries=None):
+        # CLI values win, then .env (EMBEDDING_CACHE_PATH / EMBEDDING_CACHE_MAX_ENTRIES), then defaults
+        path = path or os.getenv("EMBEDDING_CACHE_PATH") or DEFAULT_CACHE_PATH
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries or int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # The pipeline encoder thread uses the cache; calls are never concurrent
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self.conn.commit()
+
+    def get_many(self, texts):
+        """Return {text: vector} for every text already cached for this model."""
+        by_hash = {}
+        for text in texts:
+            by_hash.setdefault(text_hash(text), []).append(text)
+
+        found = {}
+        hashes = list(by_hash)
+        now = time.time()
+        for i in range(0, len(hashes), SQLITE_MAX_PARAMS):
+            chunk = hashes[i:i + SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                [self.model_name, *chunk],
+            ).fetchall()
+            for h, blob in rows:
+                vector = np.frombuffer(blob, dtype=np.float32)
+                for text in by_hash[h]:
+                    found[text] = vector
+            self.conn.execute(
+                f"UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash IN ({placeholders})",
+                [now, self.model_name, *chunk],
+            )
+        self.conn.commit()
+
+        self.hits += len(found)
+        self.misses += len(set(texts)) - len(found)
+        return found
+
+    def put_many(self, texts, vectors):
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, text_hash, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+            [
+                (self.model_name, text_hash(text), len(vec), np.asarray(vec, dtype=np.float32).tobytes(), now)
+                for text, vec in zip(texts, vectors)
+            ],
+        )
+        self.conn.commit()
+        self.evict()
+
+    def evict(self):
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+            self.conn.commit()
+            print(f"🧹 Evicted {excess} least-recently-used cache entries")
+
+    def close(self):
+        self.conn.close()
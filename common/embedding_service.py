@@ -0,0 +1,209 @@
+# Long-lived local embedding daemon: keeps one warm model per host and serves batched encode requests.
+# Start it once:  python -m common.embedding_service [--port 8765] [--backend onnx-int8]
+# prepare_embeddings.py and main.py use it when EMBEDDING_SERVICE_URL (or --service-url) answers /health.
+import argparse
+import base64
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+CLIENT_REQUEST_TEXTS = 1024  # texts per HTTP request sent by the client
+
+
+# --------------------------
+# Client
+# --------------------------
+class EmbeddingServiceClient:
+    """Talks to a running embedding service; ``encode`` matches ``SentenceTransformer.encode``."""
+
+    def __init__(self, url, timeout=300):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.encoded = 0
+        self.truncated = 0
+
+    def _request(self, path, payload=None):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        req = urllib.request.Request(
+            f"{self.url}{path}",
+            data=data,
+            headers={"Content-Type": "application/json"},
+            method="POST" if data is not None else "GET",
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            return json.loads(resp.read())
+
+    def health(self):
+        return self._request("/health")
+
+    def encode(self, texts, batch_size=64, normalize_embeddings=True, show_progress_bar=False):
+        if isinstance(texts, str):
+            # single query (main.py): 1-D vector, like SentenceTransformer.encode
+            return self.encode([texts], batch_size, normalize_embeddings, show_progress_bar)[0]
+        vectors = []
+        for i in range(0, len(texts), CLIENT_REQUEST_TEXTS):
+            body = self._request("/encode", {
+                "texts": list(texts[i:i + CLIENT_REQUEST_TEXTS]),
+                "batch_size": batch_size,
+                "normalize_embeddings": normalize_embeddings,
+            })
+            raw = np.frombuffer(base64.b64decode(body["vectors"]), dtype=np.float32)
+            vectors.append(raw.reshape(-1, body["dim"]))
+            self.truncated += body.get("truncated", 0)
+        self.encoded += len(texts)
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(vectors)
+
+    def report(self):
+        if self.encoded:
+            print(f"📏 {self.truncated}/{self.encoded} texts truncated at the service model's max sequence length")
+
+
+def connect_embedding_service(url, model_name, backend="torch"):
+    """Return a client when a service for the same model + backend is reachable at ``url``, else None."""
+    url = url or os.getenv("EMBEDDING_SERVICE_URL")
+    if not url:
+        return None
+
+    client = EmbeddingServiceClient(url)
+    try:
+        info = client.health()
+    except (urllib.error.URLError, OSError, ValueError):
+        print(f"⚠️ Embedding service not reachable at {url}, loading the model locally")
+        return None
+
+    if info.get("model") != model_name or info.get("backend") != backend:
+        print(
+            f"⚠️ Embedding service at {url} serves {info.get('model')} ({info.get('backend')}), "
+            f"not {model_name} ({backend}); loading the model locally"
+        )
+        return None
+
+    print(f"✅ Using embedding service at {url} ({model_name}, {backend})")
+    return client
+
+
+# --------------------------
+# Server
+# --------------------------
+class EmbeddingRequestHandler(BaseHTTPRequestHandler):
+    server_version = "EmbeddingService/1.0"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send_json(404, {"error": "not found"})
+            return
+        self._send_json(200, {
+            "status": "ok",
+            "model": self.server.model_name,
+            "backend": self.server.backend,
+            "dim": self.server.dim,
+            "encoded": self.server.encoded,
+        })
+
+    def do_POST(self):
+        if self.path != "/encode":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length))
+            texts = payload["texts"]
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                raise ValueError("'texts' must be a list of strings")
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        start = time.perf_counter()
+        # One model, one encode at a time; concurrent clients queue here
+        with self.server.model_lock:
+            truncated_before = getattr(self.server.model, "truncated", 0)
+            vectors = self.server.model.encode(
+                texts,
+                batch_size=int(payload.get("batch_size", 64)),
+                normalize_embeddings=bool(payload.get("normalize_embeddings", True)),
+                show_progress_bar=False,
+            )
+            truncated = getattr(self.server.model, "truncated", 0) - truncated_before
+            self.server.encoded += len(texts)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.server.dim)
+
+        self._send_json(200, {
+            "dim": self.server.dim,
+            "vectors": base64.b64encode(vectors.tobytes()).decode("ascii"),
+            "truncated": truncated,
+            "seconds": round(time.perf_counter() - start, 4),
+        })
+
+    def log_request(self, code="-", size="-"):
+        # keep the daemon quiet except for errors (HTTPStatus is an int too)
+        if isinstance(code, int) and code < 400:
+            return
+        super().log_request(code, size)
+
+
+def serve(model_name, backend, host, port, token_budget):
+    from common.backends import load_embedding_model
+    from common.encoding import BucketedEncoder
+
+    print(f"Loading embedding model {model_name} ({backend})...")
+    start = time.perf_counter()
+    model = load_embedding_model(model_name, backend)
+    if token_budget:
+        model = BucketedEncoder(model, token_budget)
+    print(f"✅ Model loaded in {time.perf_counter() - start:.1f}s")
+
+    server = ThreadingHTTPServer((host, port), EmbeddingRequestHandler)
+    server.model = model
+    server.model_name = model_name
+    server.backend = backend
+    server.dim = model.get_sentence_embedding_dimension()
+    server.model_lock = threading.Lock()
+    server.encoded = 0
+
+    print(f"🚀 Embedding service listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"👋 Embedding service stopped after {server.encoded} texts")
+        if hasattr(model, "report"):
+            model.report()
+
+
+if __name__ == "__main__":
+    from common.backends import BACKENDS
+    from common.encoding import DEFAULT_TOKEN_BUDGET
+
+    parser = argparse.ArgumentParser(description="Local embedding service shared by pipeline steps and the Streamlit app")
+    parser.add_argument("--model", default=os.getenv("MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2"), help="SentenceTransformer model")
+    parser.add_argument("--backend", choices=BACKENDS, default=os.getenv("EMBEDDING_BACKEND", "torch"), help="Inference backend")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Bind address (keep it on localhost)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument("--token-budget", type=int, default=DEFAULT_TOKEN_BUDGET, help="Padded tokens per length-bucketed batch (0 = plain batching)")
+
+    args = parser.parse_args()
+    serve(args.model, args.backend, args.host, args.port, args.token_budget)
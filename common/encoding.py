@@ -0,0 +1,264 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from tqdm import tqdm
+
+from common.backends import export_onnx_int8, load_embedding_model
+from common.embedding_service import connect_embedding_service
+
+
+def encode_texts(model, texts, batch_size=64, cache=None, log=True):
+    """Encode ``texts`` into normalized embeddings, returned as a float32 array in input order.
+
+    When a cache is given only texts missing from it are sent to the model, and the
+    new vectors are written back afterwards. ``log=False`` silences the per-call
+    progress output for callers that encode many small chunks.
+    """
+    start = time.perf_counter()
+    cached = cache.get_many(texts) if cache is not None else {}
+    missing = list(dict.fromkeys(t for t in texts if t not in cached))
+
+    if cache is not None and log:
+        print(f"💾 Embedding cache: {len(cached)} hits, {len(missing)} misses")
+
+    encoded = {}
+    if missing:
+        if log:
+            print(f"Encoding {len(missing)} texts (batch size {batch_size})...")
+        vectors = model.encode(
+            missing,
+            batch_size=batch_size,
+            normalize_embeddings=True,
+            show_progress_bar=log,
+        )
+        encoded = dict(zip(missing, vectors))
+        if cache is not None:
+            cache.put_many(missing, vectors)
+
+    if log:
+        elapsed = time.perf_counter() - start
+        print(f"✅ Embedded {len(texts)} texts in {elapsed:.1f}s ({len(texts) / max(elapsed, 1e-9):.1f} texts/s)")
+
+    return np.asarray(
+        [cached[t] if t in cached else encoded[t] for t in texts],
+        dtype=np.float32,
+    )
+
+
+# --------------------------
+# Length-bucketed dynamic batching
+# --------------------------
+DEFAULT_TOKEN_BUDGET = 8192  # padded tokens per model batch (≈ 64 texts × 128 tokens)
+
+
+class BucketedEncoder:
+    """Wraps an in-process SentenceTransformer with token-length bucketing.
+
+    Texts are sorted by token length and packed into batches whose padded size
+    (texts × longest text) stays under ``token_budget``; vectors come back in input order.
+    Texts longer than the model's ``max_seq_length`` are counted as truncated.
+    """
+
+    def __init__(self, model, token_budget=DEFAULT_TOKEN_BUDGET):
+        self.model = model
+        self.token_budget = token_budget
+        self.max_seq_length = model.max_seq_length
+        self.texts = 0
+        self.truncated = 0
+        self.batches = 0
+        self.real_tokens = 0
+        self.padded_tokens = 0
+
+    def __getattr__(self, name):
+        # get_sentence_embedding_dimension(), tokenizer, ... come from the wrapped model
+        return getattr(self.model, name)
+
+    def _token_lengths(self, texts):
+        ids = self.model.tokenizer(list(texts), add_special_tokens=True, truncation=False)["input_ids"]
+        return np.array([len(x) for x in ids])
+
+    def _batches(self, lengths):
+        order = np.argsort(lengths, kind="stable")
+        batch = []
+        for i in order:
+            # sorted ascending, so the newest text is the longest in the batch
+            if batch and (len(batch) + 1) * lengths[i] > self.token_budget:
+                yield batch
+                batch = []
+            batch.append(i)
+        if batch:
+            yield batch
+
+    def encode(self, texts, batch_size=64, normalize_embeddings=True, show_progress_bar=False):
+        # batch_size is accepted for API compatibility; the token budget sizes batches instead
+        if len(texts) == 0:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        raw_lengths = self._token_lengths(texts)
+        lengths = np.minimum(raw_lengths, self.max_seq_length)
+        self.texts += len(texts)
+        self.truncated += int((raw_lengths > self.max_seq_length).sum())
+
+        out = None
+        batches = list(self._batches(lengths))
+        for batch in tqdm(batches, desc="Batches", disable=not show_progress_bar):
+            vectors = self.model.encode(
+                [texts[i] for i in batch],
+                batch_size=len(batch),
+                normalize_embeddings=normalize_embeddings,
+                show_progress_bar=False,
+            )
+            if out is None:
+                out = np.zeros((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[batch] = vectors
+            self.batches += 1
+            self.real_tokens += int(lengths[batch].sum())
+            self.padded_tokens += len(batch) * int(lengths[batch].max())
+        return out
+
+    def report(self):
+        if not self.texts:
+            return
+        efficiency = self.real_tokens / max(self.padded_tokens, 1)
+        print(
+            f"📏 {self.batches} length-bucketed batches, padding efficiency {efficiency:.0%}, "
+            f"{self.truncated}/{self.texts} texts truncated at {self.max_seq_length} tokens"
+        )
+        if self.truncated:
+            print("⚠️ Some canonical texts are longer than the model's max sequence length and lose their tail")
+
+
+# --------------------------
+# Multi-process CPU encoding
+# --------------------------
+_worker_model = None
+
+
+def _init_worker(model_name, backend, threads, token_budget):
+    global _worker_model
+    import torch
+
+    # Split the cores between workers instead of letting every process grab all of them
+    torch.set_num_threads(threads)
+    _worker_model = load_embedding_model(model_name, backend)
+    if token_budget:
+        _worker_model = BucketedEncoder(_worker_model, token_budget)
+
+
+def _encode_shard(texts, batch_size, normalize_embeddings):
+    truncated_before = getattr(_worker_model, "truncated", 0)
+    vectors = _worker_model.encode(
+        texts,
+        batch_size=batch_size,
+        normalize_embeddings=normalize_embeddings,
+        show_progress_bar=False,
+    )
+    return vectors, getattr(_worker_model, "truncated", 0) - truncated_before
+
+
+class ProcessPoolEncoder:
+    """Drop-in replacement for ``SentenceTransformer.encode`` that shards batches over worker processes.
+
+    Every worker loads its own copy of the model; vectors are merged back in input order.
+    """
+
+    def __init__(self, model_name, workers, backend="torch", token_budget=DEFAULT_TOKEN_BUDGET):
+        self.model_name = model_name
+        self.backend = backend
+        self.workers = workers
+        self.token_budget = token_budget
+        self.pool = None
+        self.encoded = 0
+        self.truncated = 0
+        self.seconds = 0.0
+
+    def _start(self):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        if self.backend == "onnx-int8":
+            export_onnx_int8(self.model_name)  # once here, not in every worker at the same time
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        print(f"Starting {self.workers} encode workers ({threads} threads each)...")
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),  # torch is not fork-safe
+            initializer=_init_worker,
+            initargs=(self.model_name, self.backend, threads, self.token_budget),
+        )
+
+    def encode(self, texts, batch_size=64, normalize_embeddings=True, show_progress_bar=False):
+        if self.pool is None:
+            self._start()
+
+        start = time.perf_counter()
+        # One shard per worker, dealt round-robin in character-length order so every worker gets
+        # the same mix of short and long texts; length bucketing happens inside each worker
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        positions = [order[w::self.workers] for w in range(min(self.workers, len(order)))]
+        shards = [[texts[i] for i in shard] for shard in positions]
+        results = self.pool.map(
+            _encode_shard,
+            shards,
+            [batch_size] * len(shards),
+            [normalize_embeddings] * len(shards),
+        )
+        if show_progress_bar:
+            results = tqdm(results, total=len(shards), desc="Shards")
+
+        out = None
+        for shard, (vectors, truncated) in zip(positions, results):
+            if out is None:
+                out = np.zeros((len(texts), len(vectors[0])), dtype=np.float32)
+            out[shard] = vectors
+            self.truncated += truncated
+        if out is None:
+            out = np.zeros((0, 0), dtype=np.float32)
+
+        self.encoded += len(texts)
+        self.seconds += time.perf_counter() - start
+        return out
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        if self.encoded:
+            rate = self.encoded / max(self.seconds, 1e-9)
+            print(
+                f"⚙️ {self.workers} encode workers: {self.encoded} texts in {self.seconds:.1f}s "
+                f"({rate:.1f} texts/s, {rate / self.workers:.1f} texts/s per worker)"
+            )
+
+    def report(self):
+        if self.token_budget and self.encoded:
+            print(f"📏 {self.truncated}/{self.encoded} texts truncated at the model's max sequence length")
+
+
+# --------------------------
+# Encoder selection
+# --------------------------
+def open_encoder(model_name, backend="torch", service_url=None, workers=1, token_budget=DEFAULT_TOKEN_BUDGET):
+    """Return the cheapest available encoder: the shared service, a process pool, or an in-process model.
+
+    Local models are wrapped in ``BucketedEncoder`` unless ``token_budget`` is 0.
+    """
+    encoder = connect_embedding_service(service_url, model_name, backend)
+    if encoder is None and workers > 1:
+        encoder = ProcessPoolEncoder(model_name, workers, backend, token_budget)
+    elif encoder is None:
+        print(f"Loading embedding model ({backend})...")
+        encoder = load_embedding_model(model_name, backend)
+        if token_budget:
+            encoder = BucketedEncoder(encoder, token_budget)
+    return encoder
+
+
+def open_encoder_in_background(model_name, backend="torch", service_url=None, workers=1, token_budget=DEFAULT_TOKEN_BUDGET):
+    """Run ``open_encoder`` on a background thread; ``.result()`` on the returned future waits for it."""
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-load")
+    future = executor.submit(open_encoder, model_name, backend, service_url, workers, token_budget)
+    executor.shutdown(wait=False)
+    return future
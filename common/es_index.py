@@ -0,0 +1,301 @@
+# Explicit competitor_offers mapping: kNN-indexed dense_vector plus keyword/numeric filter fields.
+# Bootstrap once:  python -m common.es_index bootstrap [--index competitor_offers] [--m 16] [--ef-construction 100]
+# prepare_embeddings.py calls ensure_index() and refuses to upload into an index mapped differently.
+import argparse
+import os
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from elasticsearch import Elasticsearch
+
+load_dotenv()
+
+EMBEDDING_DIMS = 384  # all-MiniLM-L6-v2
+DEFAULT_HNSW_M = 16
+DEFAULT_EF_CONSTRUCTION = 100
+VECTOR_INDEX_TYPES = ("hnsw", "int8_hnsw")
+
+KEYWORD_FIELDS = (
+    "url", "stone_type", "stone_shape", "stone_clarity", "stone_color",
+    "metal_type", "metal_color", "category", "source",
+)
+NUMERIC_FIELDS = {
+    "price": "float",
+    "stone_carat_weight": "float",
+    "gold_karat": "short",
+    "ring_size": "float",
+}
+NUMERIC_TYPES = ("long", "integer", "short", "byte", "double", "float", "half_float", "scaled_float")
+
+
+# --------------------------
+# Mapping
+# --------------------------
+def index_mappings(m=DEFAULT_HNSW_M, ef_construction=DEFAULT_EF_CONSTRUCTION, vector_index_type="hnsw"):
+    """Mappings for offer docs. Embeddings are normalized at encode time, so dot_product is exact cosine."""
+    properties = {"name": {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}}}
+    properties.update({field: {"type": "keyword"} for field in KEYWORD_FIELDS})
+    properties.update({field: {"type": es_type} for field, es_type in NUMERIC_FIELDS.items()})
+    properties["content_hash"] = {"type": "keyword", "index": False}  # only read back via mget
+    properties["site"] = {"type": "keyword"}
+    properties["run_id"] = {"type": "keyword"}
+    properties["last_seen"] = {"type": "date"}
+    properties["embedding"] = {
+        "type": "dense_vector",
+        "dims": EMBEDDING_DIMS,
+        "index": True,
+        "similarity": "dot_product",
+        "index_options": {"type": vector_index_type, "m": m, "ef_construction": ef_construction},
+    }
+    return {"properties": properties}
+
+
+def index_settings(shards=1, replicas=1):
+    return {"number_of_shards": shards, "number_of_replicas": replicas}
+
+
+def mapping_problems(mappings):
+    """List the ways ``mappings`` differs from what kNN search and the filters in main.py need."""
+    properties = mappings.get("properties", {})
+    problems = []
+
+    embedding = properties.get("embedding")
+    if not embedding:
+        problems.append("embedding is not mapped")
+    elif embedding.get("type") != "dense_vector":
+        problems.append(f"embedding is {embedding.get('type')}, expected dense_vector")
+    else:
+        if embedding.get("dims") != EMBEDDING_DIMS:
+            problems.append(f"embedding has {embedding.get('dims')} dims, expected {EMBEDDING_DIMS}")
+        if embedding.get("index") is False:
+            problems.append("embedding is not indexed for kNN")
+        if embedding.get("similarity") != "dot_product":
+            problems.append(f"embedding similarity is {embedding.get('similarity')}, expected dot_product")
+
+    for field in KEYWORD_FIELDS:
+        es_type = properties.get(field, {}).get("type")
+        if es_type != "keyword":
+            problems.append(f"{field} is {es_type or 'not mapped'}, expected keyword")
+    for field in NUMERIC_FIELDS:
+        es_type = properties.get(field, {}).get("type")
+        if es_type not in NUMERIC_TYPES:
+            problems.append(f"{field} is {es_type or 'not mapped'}, expected a numeric type")
+    return problems
+
+
+# --------------------------
+# Create / validate
+# --------------------------
+def create_index(es, index, m=DEFAULT_HNSW_M, ef_construction=DEFAULT_EF_CONSTRUCTION,
+                 vector_index_type="hnsw", shards=1, replicas=1):
+    es.indices.create(
+        index=index,
+        mappings=index_mappings(m, ef_construction, vector_index_type),
+        settings=index_settings(shards, replicas),
+    )
+
+
+def put_index_template(es, name, m=DEFAULT_HNSW_M, ef_construction=DEFAULT_EF_CONSTRUCTION,
+                       vector_index_type="hnsw", shards=1, replicas=1):
+    """Template so ``name`` and any ``name-*`` index picks up the mapping on first write."""
+    es.indices.put_index_template(
+        name=name,
+        index_patterns=[name, f"{name}-*"],
+        template={
+            "mappings": index_mappings(m, ef_construction, vector_index_type),
+            "settings": index_settings(shards, replicas),
+        },
+    )
+
+
+def ensure_index(es, index):
+    """Create ``index`` if it is missing, otherwise raise if its mapping can't serve kNN search
+    or it is an alias that can't take writes."""
+    if not es.indices.exists(index=index):
+        template_mappings = es.indices.simulate_index_template(name=index).get("template", {}).get("mappings", {})
+        if template_mappings and not mapping_problems(template_mappings):
+            es.indices.create(index=index)
+            print(f"🆕 Created index {index} from its index template")
+        else:
+            create_index(es, index)
+            print(f"🆕 Created index {index} with the default mapping")
+        return
+
+    # an alias over several sites' blue/green generations has no write index: mget and bulk
+    # against it would fail mid-run, so refuse up front
+    if es.indices.exists_alias(name=index):
+        backing = sorted(es.indices.get_alias(name=index))
+        if len(backing) > 1:
+            raise ValueError(
+                f"❌ {index} is an alias over {len(backing)} indices ({', '.join(backing)}) and can't take writes. "
+                f"Load it with --blue-green, which writes a new generation and swaps it into the alias."
+            )
+
+    # an alias may point at several backing indices; every one must be mapped correctly
+    for name, body in es.indices.get_mapping(index=index).items():
+        problems = mapping_problems(body.get("mappings", {}))
+        if problems:
+            raise ValueError(
+                f"❌ Refusing to upload into {name}: " + "; ".join(problems)
+                + ". Recreate it with: python -m common.es_index bootstrap --index " + name + " --recreate"
+            )
+    print(f"✅ {index} mapping checked")
+
+
+# --------------------------
+# Bulk-load mode
+# --------------------------
+LOAD_MODE_SETTINGS = {
+    "index.refresh_interval": "-1",
+    "index.number_of_replicas": 0,
+    # fewer, larger flushes while the load streams in; durability comes back with the restore
+    "index.translog.durability": "async",
+    "index.translog.flush_threshold_size": "1gb",
+}
+
+
+@contextmanager
+def load_mode(es, index, enabled=True, force_merge_segments=None):
+    """Disable refresh/replicas on ``index`` for a bulk load; restore, refresh and optionally force-merge afterwards.
+
+    Settings are restored in a ``finally`` so a crashed run never leaves the index unrefreshed or unreplicated.
+    """
+    if not enabled:
+        yield
+        return
+
+    current = es.indices.get_settings(index=index, flat_settings=True)
+    # keys missing from the original settings are reset to the cluster default with None
+    original = {
+        name: {key: body["settings"].get(key) for key in LOAD_MODE_SETTINGS}
+        for name, body in current.items()
+    }
+    for name in original:
+        es.indices.put_settings(index=name, settings=LOAD_MODE_SETTINGS)
+    print(f"⚙️ Load mode on for {', '.join(original)} (refresh off, 0 replicas, async translog)")
+
+    try:
+        yield
+    finally:
+        for name, settings in original.items():
+            es.indices.put_settings(index=name, settings=settings)
+        start = time.perf_counter()
+        es.indices.refresh(index=index)
+        print(f"✅ Restored settings and refreshed {index} in {time.perf_counter() - start:.1f}s")
+        if force_merge_segments:
+            start = time.perf_counter()
+            es.options(request_timeout=3600).indices.forcemerge(index=index, max_num_segments=force_merge_segments)
+            print(f"🧱 Force-merged {index} to {force_merge_segments} segment(s) in {time.perf_counter() - start:.1f}s")
+
+
+# --------------------------
+# Blue/green generations
+# --------------------------
+def generation_prefix(alias, source):
+    return f"{alias}-{source}-"
+
+
+def create_generation(es, alias, source):
+    """Create a fresh timestamped index ``<alias>-<source>-<ts>`` for one source's full load."""
+    if es.indices.exists(index=alias) and not es.indices.exists_alias(name=alias):
+        raise ValueError(
+            f"❌ {alias} is a concrete index, so it can't become the blue/green alias. "
+            f"Reindex or delete it before loading with --blue-green."
+        )
+    index = generation_prefix(alias, source) + time.strftime("%Y%m%d%H%M%S")
+    ensure_index(es, index)
+    return index
+
+
+def promote_generation(es, alias, source, index, expected_count, keep=2):
+    """Check ``index`` holds ``expected_count`` docs, then atomically point ``alias`` at it.
+
+    Only the previous generation of the same source leaves the alias, so other sites stay searchable.
+    The newest ``keep`` generations of this source are retained for rollback; older ones are deleted.
+    """
+    es.indices.refresh(index=index)
+    count = es.count(index=index)["count"]
+    if count != expected_count:
+        raise RuntimeError(f"❌ {index} holds {count} docs, expected {expected_count}; alias {alias} left unchanged")
+
+    prefix = generation_prefix(alias, source)
+    live = es.indices.get_alias(name=alias) if es.indices.exists_alias(name=alias) else {}
+    previous = [name for name in live if name.startswith(prefix) and name != index]
+    es.indices.update_aliases(actions=[
+        {"add": {"index": index, "alias": alias}},
+        *({"remove": {"index": name, "alias": alias}} for name in previous),
+    ])
+    print(f"🔀 {alias} → {index} ({count} docs)" + (f", replaced {', '.join(previous)}" if previous else ""))
+
+    # timestamps sort lexically, so the tail of the list is the newest generations
+    generations = sorted(es.indices.get(index=prefix + "*"))
+    for name in generations[:-max(keep, 1)]:
+        if name != index:
+            es.indices.delete(index=name)
+            print(f"🗑 Deleted old generation {name}")
+
+
+def connect(host=None, user=None, password=None):
+    host = host or os.getenv("ES_HOST")
+    user = user or os.getenv("ES_USER")
+    password = password or os.getenv("ES_PASSWORD")
+    if not host or not user or not password:
+        raise ValueError("Elasticsearch host/user/password not set. Provide via CLI or in .env")
+    es = Elasticsearch(host, basic_auth=(user, password), verify_certs=False)
+    if not es.ping():
+        raise RuntimeError("❌ Could not connect to Elasticsearch!")
+    return es
+
+
+# --------------------------
+# CLI
+# --------------------------
+def bootstrap(es, args):
+    if args.template:
+        put_index_template(es, args.index, args.m, args.ef_construction, args.vector_index_type, args.shards, args.replicas)
+        print(f"✅ Index template {args.index} covers {args.index} and {args.index}-*")
+        return
+
+    if es.indices.exists(index=args.index):
+        if not args.recreate:
+            problems = [
+                problem
+                for body in es.indices.get_mapping(index=args.index).values()
+                for problem in mapping_problems(body.get("mappings", {}))
+            ]
+            if problems:
+                raise ValueError(f"❌ {args.index} exists with the wrong mapping: " + "; ".join(problems) + ". Pass --recreate to drop it.")
+            print(f"✅ {args.index} already exists with a valid mapping")
+            return
+        es.indices.delete(index=args.index)
+        print(f"🗑 Deleted {args.index}")
+
+    create_index(es, args.index, args.m, args.ef_construction, args.vector_index_type, args.shards, args.replicas)
+    print(
+        f"✅ Created {args.index}: {EMBEDDING_DIMS}-dim dense_vector (dot_product, {args.vector_index_type} "
+        f"m={args.m} ef_construction={args.ef_construction})"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the competitor_offers index")
+    parser.add_argument("--host", default=None, help="Elasticsearch host URL (or ES_HOST in .env)")
+    parser.add_argument("--user", default=None, help="Elasticsearch username (or ES_USER in .env)")
+    parser.add_argument("--password", default=None, help="Elasticsearch password (or ES_PASSWORD in .env)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    boot = commands.add_parser("bootstrap", help="Create the index (or an index template) with the explicit mapping")
+    boot.add_argument("--index", default=os.getenv("INDEX_NAME", "competitor_offers"), help="Index (or template) name")
+    boot.add_argument("--m", type=int, default=DEFAULT_HNSW_M, help="HNSW graph connections per node")
+    boot.add_argument("--ef-construction", type=int, default=DEFAULT_EF_CONSTRUCTION, help="HNSW candidates considered while building the graph")
+    boot.add_argument("--vector-index-type", choices=VECTOR_INDEX_TYPES, default="hnsw", help="int8_hnsw quantizes vectors in the graph (~4x less memory)")
+    boot.add_argument("--shards", type=int, default=1, help="Primary shards")
+    boot.add_argument("--replicas", type=int, default=1, help="Replica shards")
+    boot.add_argument("--template", action="store_true", help="Put an index template for <index> and <index>-* instead of creating the index")
+    boot.add_argument("--recreate", action="store_true", help="Delete and recreate an existing index (drops its documents)")
+
+    args = parser.parse_args()
+    es = connect(args.host, args.user, args.password)
+    if args.command == "bootstrap":
+        bootstrap(es, args)
@@ -0,0 +1,114 @@
+# HTTP-first product pages: plain keep-alive GETs parsed with the site's own parser, so Chrome
+# only renders the pages whose specs aren't in the server HTML or its embedded JSON-LD.
+import json
+from threading import Lock
+
+import urllib3
+from urllib3.util.retry import Retry
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+HTTP_TIMEOUT = 15  # seconds per read
+HTTP_RETRIES = 2
+REQUIRED_FIELDS = ("metal_type",)  # normalized fields a fast-path page must yield
+MIN_FIELDS = 3                     # ...out of at least this many non-empty normalized fields
+
+
+def json_ld(soup):
+    """Every JSON-LD object on the page, with ``@graph`` containers flattened."""
+    objects = []
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            data = json.loads(script.string or "")
+        except json.JSONDecodeError:
+            continue
+        stack = data if isinstance(data, list) else [data]
+        while stack:
+            obj = stack.pop(0)
+            if isinstance(obj, dict):
+                objects.append(obj)
+                stack.extend(obj.get("@graph", []))
+    return objects
+
+
+def json_ld_properties(soup):
+    """``{name: value}`` from the ``additionalProperty`` list of the page's JSON-LD Product."""
+    props = {}
+    for obj in json_ld(soup):
+        types = obj.get("@type")
+        if "Product" not in (types if isinstance(types, list) else [types]):
+            continue
+        for prop in obj.get("additionalProperty") or []:
+            if isinstance(prop, dict) and prop.get("name") and prop.get("value") not in (None, ""):
+                props[str(prop["name"]).strip()] = str(prop["value"]).strip()
+    return props
+
+
+def has_required_fields(attrs, required=REQUIRED_FIELDS, min_fields=MIN_FIELDS):
+    """True when normalized ``attrs`` look like a full spec page, not a partial or generic one."""
+    filled = [field for field, value in attrs.items() if value not in (None, "", "N/A")]
+    return all(field in filled for field in required) and len(filled) >= min_fields
+
+
+class HttpFetcher:
+    """Pooled keep-alive GETs plus fast-path hit-rate counters for one site.
+
+    ``fetch(url, parse)`` returns whatever ``parse(html)`` returns, or None when the request
+    failed or the parser found the page incomplete; callers fall back to the browser then.
+    Thread-safe: one fetcher is shared by every worker.
+    """
+
+    def __init__(self, site, maxsize=10, timeout=HTTP_TIMEOUT):
+        self.site = site
+        self.pool = urllib3.PoolManager(
+            num_pools=4,
+            maxsize=maxsize,
+            headers=DEFAULT_HEADERS,
+            timeout=urllib3.Timeout(connect=5, read=timeout),
+            retries=Retry(total=HTTP_RETRIES, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504)),
+        )
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, url):
+        try:
+            resp = self.pool.request("GET", url)
+        except urllib3.exceptions.HTTPError:
+            with self.lock:
+                self.errors += 1
+            return None
+        content_type = resp.headers.get("Content-Type", "text/html")
+        if resp.status != 200 or "html" not in content_type:
+            with self.lock:
+                self.errors += 1
+            return None
+        charset = content_type.split("charset=")[-1].split(";")[0].strip() if "charset=" in content_type else "utf-8"
+        try:
+            return resp.data.decode(charset, errors="replace")
+        except LookupError:
+            return resp.data.decode("utf-8", errors="replace")
+
+    def fetch(self, url, parse):
+        html = self.get(url)
+        result = parse(html) if html else None
+        with self.lock:
+            if result:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return result or None
+
+    def summary(self):
+        total = self.hits + self.misses
+        if not total:
+            return
+        print(f"⚡ {self.site}: {self.hits}/{total} pages ({self.hits / total:.0%}) parsed over HTTP, "
+              f"{self.misses} fell back to the browser ({self.errors} HTTP errors/blocks)")
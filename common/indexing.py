@@ -0,0 +1,147 @@
+import queue
+import threading
+import time
+
+from common.backup import BackupWriter, action_doc
+from common.encoding import encode_texts
+
+_DONE = object()
+MGET_BATCH = 1000
+
+
+# --------------------------
+# Skip offers whose content hash is already indexed
+# --------------------------
+def skip_unchanged(es, index, items):
+    """Drop duplicate IDs (last row wins) and items whose ``content_hash`` matches the indexed copy.
+
+    Runs before encoding, so unchanged offers cost one mget instead of an encode and a write.
+    Returns ``(items_to_write, unchanged_actions)``; pass the latter to ``stream_index`` so the
+    backup still holds every offer.
+    """
+    by_id = {action["_id"]: (text, action) for text, action in items}
+    if len(by_id) < len(items):
+        print(f"⚠️ {len(items) - len(by_id)} rows share a URL with a later row; keeping the last one")
+
+    ids = list(by_id)
+    unchanged = set()
+    for i in range(0, len(ids), MGET_BATCH):
+        resp = es.mget(index=index, ids=ids[i:i + MGET_BATCH], source_includes=["content_hash"])
+        for doc in resp["docs"]:
+            if not doc.get("found"):
+                continue
+            _, action = by_id[doc["_id"]]
+            if doc["_source"].get("content_hash") == action_doc(action)["content_hash"]:
+                unchanged.add(doc["_id"])
+
+    print(f"⏭ {len(unchanged)} of {len(by_id)} offers unchanged since the last load; {len(by_id) - len(unchanged)} to write")
+    return (
+        [item for doc_id, item in by_id.items() if doc_id not in unchanged],
+        [action for doc_id, (_, action) in by_id.items() if doc_id in unchanged],
+    )
+
+
+def iter_indexed_copies(es, actions):
+    """Yield ``actions`` with their document replaced by the indexed copy (embedding included)."""
+    missing = 0
+    for i in range(0, len(actions), MGET_BATCH):
+        batch = actions[i:i + MGET_BATCH]
+        resp = es.mget(index=batch[0]["_index"], ids=[action["_id"] for action in batch])
+        for action, doc in zip(batch, resp["docs"]):
+            if not doc.get("found") or "embedding" not in doc["_source"]:
+                missing += 1
+                continue
+            copy = dict(action)
+            copy["_source" if "_source" in action else "doc"] = doc["_source"]
+            yield copy
+    if missing:
+        print(f"⚠️ {missing} unchanged offers couldn't be read back with their embedding; they're missing from the backup")
+
+
+# --------------------------
+# Producer: encode chunks on a background thread
+# --------------------------
+def iter_encoded_actions(model, items, batch_size=64, cache=None, encode_chunk=512, queue_size=4):
+    """Yield bulk actions with their ``embedding`` filled in, encoding ahead of the consumer.
+
+    ``items`` is a list of ``(text, action)`` pairs. Encoding runs on a background thread
+    and at most ``queue_size`` encoded chunks wait in memory for the consumer. Each unique
+    text is encoded once and its vector fanned out to every action that shares it.
+    """
+    chunks = queue.Queue(maxsize=queue_size)
+    stats = {"encoded": 0, "seconds": 0.0}
+
+    # Size/metal variants and cross-listed items share a canonical text: encode each string once
+    unique_count = len(set(text for text, _ in items))
+    if items:
+        print(
+            f"🔁 {len(items)} rows → {unique_count} unique texts "
+            f"(dedup ratio {1 - unique_count / len(items):.1%})"
+        )
+
+    def produce():
+        vectors_by_text = {}
+        try:
+            for i in range(0, len(items), encode_chunk):
+                chunk = items[i:i + encode_chunk]
+                new_texts = [t for t in dict.fromkeys(text for text, _ in chunk) if t not in vectors_by_text]
+                if new_texts:
+                    start = time.perf_counter()
+                    vectors = encode_texts(model, new_texts, batch_size, cache, log=False)
+                    stats["seconds"] += time.perf_counter() - start
+                    stats["encoded"] += len(new_texts)
+                    vectors_by_text.update(zip(new_texts, (v.tolist() for v in vectors)))
+                for text, action in chunk:
+                    action_doc(action)["embedding"] = vectors_by_text[text]
+                chunks.put([action for _, action in chunk])
+        except BaseException as e:
+            chunks.put(e)
+        finally:
+            chunks.put(_DONE)
+
+    producer = threading.Thread(target=produce, name="encoder", daemon=True)
+    producer.start()
+
+    while True:
+        chunk = chunks.get()
+        if chunk is _DONE:
+            break
+        if isinstance(chunk, BaseException):
+            raise chunk
+        yield from chunk
+
+    producer.join()
+    if hasattr(model, "report"):
+        model.report()
+    if cache is not None:
+        print(f"💾 Embedding cache: {cache.hits} hits, {cache.misses} misses")
+    rate = stats["encoded"] / max(stats["seconds"], 1e-9)
+    print(f"✅ Embedded {stats['encoded']} unique texts in {stats['seconds']:.1f}s of encoder time ({rate:.1f} texts/s)")
+
+
+# --------------------------
+# Consumer: bulk-load into Elasticsearch
+# --------------------------
+def stream_index(indexer, actions, backup_path, total=None, vector_format="json", unchanged=()):
+    """Send ``actions`` through a ``BulkIndexer`` while writing the NDJSON backup.
+
+    ``unchanged`` offers (from ``skip_unchanged``) aren't sent; their indexed copies are read
+    back and appended to the backup, so it stays a full snapshot for ``common.replay``.
+    Returns ``(indexed_count, errors)`` where ``errors`` holds the failed bulk items.
+    """
+    backup = BackupWriter(backup_path, None if total is None else total + len(unchanged), vector_format)
+
+    def with_backup():
+        for action in actions:
+            backup.write(action)
+            yield action
+
+    try:
+        result = indexer.index(with_backup(), total=total)
+        for action in iter_indexed_copies(indexer.es, list(unchanged)):
+            backup.write(action)
+        return result
+    finally:
+        backup.close()
+        if indexer.dead_letter is not None:
+            indexer.dead_letter.close()
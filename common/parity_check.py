@@ -0,0 +1,83 @@
+# Reports cosine drift of the onnx-int8 backend against torch on the committed normalized CSVs.
+# Usage (from the repo root): python -m common.parity_check [--limit N]
+import argparse
+import importlib.util
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from common.backends import load_embedding_model
+
+load_dotenv()
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# site -> normalized CSV whose rows are run through that site's build_text
+SITES = {
+    "kay_jewelers": "kay_jewelers/poc_kay_normalized.csv",
+    "glamira": "glamira/poc_glamira_normalized.csv",
+    "rarecarat": "rarecarat/poc_rarecarat_normalized.csv",
+    "1stdibs": "1stdibs/poc_1stdibs_normalized.csv",
+}
+
+
+def load_site_texts(site, csv_path, limit=None):
+    spec = importlib.util.spec_from_file_location(
+        f"{site}_prepare_embeddings", os.path.join(ROOT, site, "prepare_embeddings.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    df = pd.read_csv(os.path.join(ROOT, csv_path))
+    if limit:
+        df = df.head(limit)
+    return [module.build_text(row) for _, row in df.iterrows()]
+
+
+def timed_encode(model, texts, batch_size):
+    start = time.perf_counter()
+    vectors = model.encode(texts, batch_size=batch_size, normalize_embeddings=True, show_progress_bar=False)
+    return np.asarray(vectors, dtype=np.float32), time.perf_counter() - start
+
+
+def main(args):
+    print("Loading torch + onnx-int8 models...")
+    torch_model = load_embedding_model(args.model, "torch")
+    onnx_model = load_embedding_model(args.model, "onnx-int8")
+
+    print(f"\n{'site':<14}{'rows':>6}{'mean cos':>10}{'min cos':>10}{'p01 cos':>10}{'torch s':>9}{'onnx s':>9}{'speedup':>9}")
+    all_cos = []
+    for site, csv_path in SITES.items():
+        texts = load_site_texts(site, csv_path, args.limit)
+        if not texts:
+            continue
+        ref, torch_s = timed_encode(torch_model, texts, args.batch_size)
+        quant, onnx_s = timed_encode(onnx_model, texts, args.batch_size)
+        # both sides are L2-normalized, so the row-wise dot product is the cosine
+        cos = np.sum(ref * quant, axis=1)
+        all_cos.append(cos)
+        print(
+            f"{site:<14}{len(texts):>6}{cos.mean():>10.4f}{cos.min():>10.4f}"
+            f"{np.percentile(cos, 1):>10.4f}{torch_s:>9.2f}{onnx_s:>9.2f}{torch_s / max(onnx_s, 1e-9):>8.1f}x"
+        )
+
+    if all_cos:
+        cos = np.concatenate(all_cos)
+        print(f"\nOverall: {len(cos)} texts, mean cosine {cos.mean():.4f}, worst {cos.min():.4f}")
+        if cos.min() < args.min_cosine:
+            print(f"⚠️ Worst-case cosine is below {args.min_cosine}; check recall before switching backends.")
+        else:
+            print(f"✅ All vectors within cosine {args.min_cosine} of torch.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare onnx-int8 embeddings against torch on the normalized CSVs")
+    parser.add_argument("--model", default=os.getenv("MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2"), help="SentenceTransformer model")
+    parser.add_argument("--batch-size", type=int, default=64, help="Number of texts encoded per model batch")
+    parser.add_argument("--limit", type=int, default=None, help="Rows per CSV (default: all)")
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="Warn when any vector drifts below this cosine")
+
+    main(parser.parse_args())
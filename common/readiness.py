@@ -0,0 +1,68 @@
+# Event-driven page readiness for the detail scrapers: wait for the element we actually parse
+# instead of scrolling the whole page with fixed sleeps. Scrolling only happens when the
+# target hasn't rendered after a short probe (lazy-loaded sections).
+import time
+
+READY_TIMEOUT = 10  # seconds before a page counts as failed
+PROBE_TIMEOUT = 2   # seconds to wait in place before scrolling towards lazy content
+SCROLL_STEP = 800   # px per scroll step while probing
+POLL = 0.1
+
+
+def _present(driver, selector, timeout):
+    # imported here so the Playwright scraper doesn't need selenium installed
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=POLL).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, selector))
+        )
+        return True
+    except TimeoutException:
+        return False
+
+
+def wait_for_ready(driver, selector, timeout=READY_TIMEOUT, probe=PROBE_TIMEOUT):
+    """Wait until ``selector`` is in the DOM; True if it showed up within ``timeout`` seconds."""
+    deadline = time.monotonic() + timeout
+    if _present(driver, selector, min(probe, timeout)):
+        return True
+
+    y = 0
+    while time.monotonic() < deadline:
+        y += SCROLL_STEP
+        driver.execute_script("window.scrollTo(0, arguments[0]);", y)
+        if _present(driver, selector, POLL * 5):
+            return True
+        if y >= (driver.execute_script("return document.body.scrollHeight") or 0):
+            return _present(driver, selector, max(deadline - time.monotonic(), 0))
+    return False
+
+
+async def wait_for_ready_async(page, selector, timeout=READY_TIMEOUT, probe=PROBE_TIMEOUT):
+    """Playwright version of ``wait_for_ready``."""
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+    async def present(seconds):
+        try:
+            # timeout=0 means "wait forever" in Playwright
+            await page.wait_for_selector(selector, state="attached", timeout=max(seconds * 1000, 1))
+            return True
+        except PlaywrightTimeoutError:
+            return False
+
+    deadline = time.monotonic() + timeout
+    if await present(min(probe, timeout)):
+        return True
+
+    while time.monotonic() < deadline:
+        await page.mouse.wheel(0, SCROLL_STEP)
+        if await present(POLL * 5):
+            return True
+        at_bottom = await page.evaluate("window.scrollY + window.innerHeight >= document.body.scrollHeight")
+        if at_bottom:
+            return await present(max(deadline - time.monotonic(), 0))
+    return False
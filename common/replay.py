@@ -0,0 +1,83 @@
+# Reload a prepare_embeddings NDJSON backup as-is (vectors included), so no model or torch is needed.
+#   python -m common.replay competitor_offers.ndjson [--index competitor_offers_restore] [--index-threads 8]
+import argparse
+import os
+import time
+
+from common.backup import iter_backup_actions
+from common.dead_letter import DeadLetterQueue
+from common.bulk_indexer import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_MAX_BYTES,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_TARGET_LATENCY,
+    BulkIndexer,
+)
+from common.es_index import connect, ensure_index, load_mode
+
+
+def count_actions(ndjson_path):
+    with open(ndjson_path, "rb") as f:
+        return sum(1 for line in f if line.strip()) // 2
+
+
+def replay(es, ndjson_path, vectors_path=None, index=None, threads=8, chunk_size=DEFAULT_CHUNK_SIZE,
+           max_bytes=DEFAULT_MAX_BYTES, max_retries=DEFAULT_MAX_RETRIES, adaptive=True,
+           target_latency=DEFAULT_TARGET_LATENCY, dead_letter=None):
+    """Stream a backup into Elasticsearch, optionally rewriting every action's ``_index``."""
+    def actions():
+        for action in iter_backup_actions(ndjson_path, vectors_path):
+            if index:
+                action["_index"] = index
+            yield action
+
+    indexer = BulkIndexer(
+        es,
+        threads=threads,
+        chunk_size=chunk_size,
+        max_bytes=max_bytes,
+        max_retries=max_retries,
+        adaptive=adaptive,
+        target_latency=target_latency,
+        dead_letter=dead_letter,
+    )
+    try:
+        return indexer.index(actions(), total=count_actions(ndjson_path))
+    finally:
+        if dead_letter is not None:
+            dead_letter.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load an NDJSON embeddings backup back into Elasticsearch")
+    parser.add_argument("ndjson", help="Backup written by prepare_embeddings.py --output")
+    parser.add_argument("--vectors", default=None, help="Vector sidecar for --vector-format float32/float16 backups (default: <ndjson stem>.vectors.npy)")
+    parser.add_argument("--index", default=None, help="Rewrite every doc into this index instead of the one recorded in the backup")
+    parser.add_argument("--index-threads", type=int, default=8, help="Parallel bulk requests in flight")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Starting docs per bulk request (adapted to --target-latency)")
+    parser.add_argument("--max-bytes", type=int, default=DEFAULT_MAX_BYTES, help="Max bytes per bulk request")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES, help="Retries with exponential backoff for 429/503 rejections")
+    parser.add_argument("--target-latency", type=float, default=DEFAULT_TARGET_LATENCY, help="Seconds per bulk request the adaptive chunk size aims for")
+    parser.add_argument("--fixed-chunk-size", action="store_true", help="Keep --chunk-size fixed instead of adapting it")
+    parser.add_argument("--load-mode", action="store_true", help="With --index: disable refresh and replicas during the replay (restored afterwards)")
+    parser.add_argument("--dead-letter-dir", default=None, help="Where failed docs are dead-lettered (default: <ndjson>_dead_letter)")
+    parser.add_argument("--host", default=None, help="Elasticsearch host URL (optional, fallback to .env)")
+    parser.add_argument("--user", default=None, help="Elasticsearch username (optional, fallback to .env)")
+    parser.add_argument("--password", default=None, help="Elasticsearch password (optional, fallback to .env)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.ndjson):
+        raise FileNotFoundError(f"❌ Backup not found: {args.ndjson}")
+
+    es = connect(args.host, args.user, args.password)
+    if args.index:
+        ensure_index(es, args.index)
+
+    start = time.perf_counter()
+    with load_mode(es, args.index, enabled=bool(args.index and args.load_mode)):
+        indexed, errors = replay(
+            es, args.ndjson, args.vectors, args.index, args.index_threads, args.chunk_size, args.max_bytes,
+            args.max_retries, not args.fixed_chunk_size, args.target_latency,
+            DeadLetterQueue(args.dead_letter_dir or f"{args.ndjson}_dead_letter"),
+        )
+    print(f"✅ Replayed {indexed} docs from {args.ndjson} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,166 @@
+# Block images, media, fonts and trackers on product pages: the detail scrapers only read spec tables.
+# Selenium drivers use CDP Network.setBlockedURLs, Playwright pages/contexts abort matching routes.
+import json
+from collections import Counter
+from threading import Lock
+from urllib.parse import urlsplit
+
+# Playwright resource types that never carry spec data
+BLOCKED_RESOURCE_TYPES = ("image", "media", "font")
+
+# CDP only matches URL patterns, so the same types are blocked by extension for Selenium
+BLOCKED_EXTENSIONS = (
+    "jpg", "jpeg", "png", "gif", "webp", "avif", "svg", "ico",
+    "mp4", "webm", "m3u8", "mov",
+    "woff", "woff2", "ttf", "otf", "eot",
+)
+
+# third-party analytics/ads/chat hosts, blocked on every site (subdomains included)
+TRACKER_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googleadservices.com",
+    "googlesyndication.com",
+    "facebook.net",
+    "facebook.com",
+    "connect.facebook.net",
+    "bat.bing.com",
+    "clarity.ms",
+    "hotjar.com",
+    "criteo.com",
+    "criteo.net",
+    "pinimg.com",
+    "ct.pinterest.com",
+    "analytics.tiktok.com",
+    "snapchat.com",
+    "klaviyo.com",
+    "attn.tv",
+    "quantummetric.com",
+    "newrelic.com",
+    "nr-data.net",
+    "optimizely.com",
+    "yotpo.com",
+    "trustpilot.com",
+    "livechatinc.com",
+    "zendesk.com",
+    "intercom.io",
+)
+
+# image/video CDNs and widgets specific to each site
+SITE_BLOCKED_HOSTS = {
+    "kay": ("scene7.com", "bazaarvoice.com", "contentsquare.net", "tealiumiq.com", "tiqcdn.com"),
+    "glamira": ("cdn-media.glamira.com", "trustedshops.com", "cloudimg.io"),
+    "1stdibs": ("a.1stdibscdn.com", "segment.io", "segment.com", "branch.io"),
+    "rarecarat": ("videos.rarecarat.com", "fullstory.com", "intercomcdn.com"),
+}
+
+
+def blocked_hosts(site):
+    return TRACKER_HOSTS + SITE_BLOCKED_HOSTS.get(site, ())
+
+
+def blocked_url_patterns(site):
+    """Wildcard patterns for CDP ``Network.setBlockedURLs``."""
+    patterns = [f"*.{ext}" for ext in BLOCKED_EXTENSIONS] + [f"*.{ext}?*" for ext in BLOCKED_EXTENSIONS]
+    patterns += [f"*://{host}/*" for host in blocked_hosts(site)]
+    patterns += [f"*://*.{host}/*" for host in blocked_hosts(site)]
+    return patterns
+
+
+def is_blocked_host(url, hosts):
+    host = urlsplit(url).hostname or ""
+    return any(host == h or host.endswith("." + h) for h in hosts)
+
+
+class BlockStats:
+    """Blocked request counts and downloaded bytes, shared by every driver/page of a run.
+
+    Bytes that were never requested can't be measured; the saving shows up as lower
+    ``bytes_downloaded`` per page compared with a run with blocking turned off.
+    """
+
+    def __init__(self, site):
+        self.site = site
+        self.lock = Lock()
+        self.pages = 0
+        self.blocked = Counter()
+        self.bytes_downloaded = 0
+
+    def add(self, pages=0, blocked=None, bytes_downloaded=0):
+        with self.lock:
+            self.pages += pages
+            self.blocked.update(blocked or {})
+            self.bytes_downloaded += bytes_downloaded
+
+    def summary(self):
+        total = sum(self.blocked.values())
+        per_page = self.bytes_downloaded / max(self.pages, 1) / 1024 / 1024
+        kinds = ", ".join(f"{count} {kind}" for kind, count in self.blocked.most_common(5))
+        print(f"🚫 {self.site}: blocked {total} requests over {self.pages} pages ({kinds or 'none'}); "
+              f"{self.bytes_downloaded / 1024 / 1024:.1f} MB downloaded ({per_page:.2f} MB/page)")
+
+
+# --------------------------
+# Selenium (Chrome DevTools Protocol)
+# --------------------------
+def add_selenium_logging(options):
+    """Let ``collect_selenium_stats`` read network events; call on ChromeOptions before starting Chrome."""
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return options
+
+
+def enable_selenium_blocking(driver, site):
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked_url_patterns(site)})
+    return driver
+
+
+def collect_selenium_stats(driver, stats):
+    """Drain the performance log after a page load and count blocked requests / received bytes."""
+    blocked = Counter()
+    received = 0
+    try:
+        entries = driver.get_log("performance")
+    except Exception:
+        return
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+            method, params = message.get("method"), message.get("params") or {}
+        except (KeyError, TypeError, ValueError):  # malformed log entry: stats only, never fail the page
+            continue
+        if method == "Network.loadingFailed" and params.get("blockedReason"):
+            blocked[str(params.get("type", "Other")).lower()] += 1
+        elif method == "Network.loadingFinished":
+            received += params.get("encodedDataLength") or 0
+    stats.add(pages=1, blocked=blocked, bytes_downloaded=received)
+
+
+# --------------------------
+# Playwright
+# --------------------------
+async def enable_playwright_blocking(target, site, stats=None):
+    """Abort blocked resource types and hosts on a Playwright page or browser context."""
+    hosts = blocked_hosts(site)
+
+    async def handle(route):
+        request = route.request
+        if request.resource_type in BLOCKED_RESOURCE_TYPES or is_blocked_host(request.url, hosts):
+            if stats is not None:
+                stats.add(blocked={request.resource_type: 1})
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def on_finished(request):
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        stats.add(bytes_downloaded=sizes["responseBodySize"] + sizes["responseHeadersSize"])
+
+    await target.route("**/*", handle)
+    if stats is not None:
+        target.on("requestfinished", on_finished)
+    return target
@@ -0,0 +1,197 @@
+# Stale-offer sweeper: every successful load records which offers it saw, and docs of that site
+# missing from the latest N runs are deleted with a throttled delete_by_query.
+# Manual sweep:  python -m common.sweeper --index competitor_offers --site kay [--keep-runs 3]
+# Docs indexed before site/run stamps existed (positional IDs, no ``site`` field) are only
+# reachable through their ``source`` value; pass it as --legacy-source to delete them too.
+import argparse
+import os
+import time
+from datetime import datetime, timezone
+
+from elasticsearch import NotFoundError, helpers
+
+from common.es_index import connect
+
+DEFAULT_KEEP_RUNS = 3
+DEFAULT_REQUESTS_PER_SECOND = 500
+DEFAULT_MAX_SWEEP_RATIO = 0.5
+
+RUNS_MAPPINGS = {
+    "properties": {
+        "site": {"type": "keyword"},
+        "run_id": {"type": "keyword"},
+        "finished_at": {"type": "date"},
+        "doc_count": {"type": "integer"},
+        # read back through terms lookups only
+        "doc_ids": {"type": "keyword", "index": False, "doc_values": False},
+    }
+}
+
+
+def runs_index(index):
+    # underscore, not dash: <index>-* is reserved for blue/green generations and their template
+    return f"{index}_runs"
+
+
+def run_stamp(site):
+    """``run_id``/``last_seen`` fields stamped on every doc written by this run."""
+    return {
+        "run_id": f"{site}-{time.strftime('%Y%m%dT%H%M%S')}",
+        "last_seen": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def stamp_only(action):
+    """Partial update that only moves ``run_id``/``last_seen`` of an already indexed offer to this run."""
+    doc = action.get("doc") or action.get("_source") or {}
+    return {
+        "_op_type": "update",
+        "_index": action["_index"],
+        "_id": action["_id"],
+        "doc": {"run_id": doc["run_id"], "last_seen": doc["last_seen"]},
+    }
+
+
+def refresh_stamps(es, actions):
+    """Stamp offers skipped as unchanged with this run, so ``last_seen`` means "last scraped", not "last written"."""
+    if not actions:
+        return 0
+    refreshed, errors = helpers.bulk(es, (stamp_only(action) for action in actions), chunk_size=1000,
+                                     raise_on_error=False, stats_only=True)
+    if errors:
+        print(f"⚠️ Couldn't refresh run_id/last_seen on {errors} unchanged offers")
+    return refreshed
+
+
+def record_run(es, index, site, run_id, doc_ids):
+    """Store the IDs this run saw, including offers skipped as unchanged (their stamps aren't rewritten)."""
+    name = runs_index(index)
+    if not es.indices.exists(index=name):
+        es.indices.create(index=name, mappings=RUNS_MAPPINGS)
+    es.index(
+        index=name,
+        id=run_id,
+        document={
+            "site": site,
+            "run_id": run_id,
+            "finished_at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "doc_count": len(doc_ids),
+            "doc_ids": list(doc_ids),
+        },
+        refresh="wait_for",
+    )
+    print(f"📝 Recorded run {run_id} ({len(doc_ids)} offers)")
+
+
+def doc_sources(items):
+    """``source`` values of the docs in ``items`` (``(text, action)`` pairs), for ``legacy_sources``."""
+    sources = set()
+    for _, action in items:
+        doc = action.get("doc") or action.get("_source") or {}
+        if doc.get("source"):
+            sources.add(doc["source"])
+    return sources
+
+
+def legacy_query(sources):
+    """Docs from before site/run stamps: matching ``source`` but no ``site`` field."""
+    return {
+        "bool": {
+            "filter": [{"terms": {"source": sorted(sources)}}],
+            "must_not": [{"exists": {"field": "site"}}],
+        }
+    }
+
+
+def sweep_stale(es, index, site, keep_runs=DEFAULT_KEEP_RUNS, requests_per_second=DEFAULT_REQUESTS_PER_SECOND,
+                max_ratio=DEFAULT_MAX_SWEEP_RATIO, legacy_sources=()):
+    """Delete ``site`` docs in ``index`` that none of the latest ``keep_runs`` runs saw.
+
+    Runs as a background delete_by_query throttled to ``requests_per_second`` and polled through
+    the tasks API. Refuses when more than ``max_ratio`` of the site's docs would go, which usually
+    means a scrape came back short rather than that the competitor delisted half its catalogue.
+    Legacy docs whose ``source`` is in ``legacy_sources`` and that have no ``site`` field are
+    deleted as well; the current run re-indexed them under stable IDs, so they don't count
+    towards ``max_ratio``.
+    """
+    try:
+        runs = es.search(
+            index=runs_index(index),
+            query={"term": {"site": site}},
+            sort=[{"finished_at": "desc"}],
+            size=keep_runs,
+            source=False,
+        )["hits"]["hits"]
+    except NotFoundError:  # no load has finished against this index yet
+        runs = []
+    if not runs:
+        print(f"⚠️ No runs recorded for {site} in {runs_index(index)} yet (load it with prepare_embeddings.py first); nothing swept")
+        return 0
+
+    query = {
+        "bool": {
+            "filter": [{"term": {"site": site}}],
+            "must_not": [
+                {"terms": {"_id": {"index": runs_index(index), "id": run["_id"], "path": "doc_ids"}}}
+                for run in runs
+            ],
+        }
+    }
+    total = es.count(index=index, query={"term": {"site": site}})["count"]
+    stale = es.count(index=index, query=query)["count"]
+    legacy = es.count(index=index, query=legacy_query(legacy_sources))["count"] if legacy_sources else 0
+    if not stale and not legacy:
+        print(f"✅ No stale {site} offers (checked against the last {len(runs)} runs)")
+        return 0
+    if stale > total * max_ratio:
+        raise RuntimeError(
+            f"❌ Sweep would delete {stale} of {total} {site} offers (> {max_ratio:.0%}); "
+            f"check the last scrape or rerun with a higher --max-sweep-ratio"
+        )
+    if legacy:
+        query = {"bool": {"should": [query, legacy_query(legacy_sources)], "minimum_should_match": 1}}
+        print(f"🧹 Deleting {legacy} legacy {site} offers without a site field (pre-stable-ID duplicates)...")
+
+    if stale:
+        print(f"🧹 Deleting {stale} stale {site} offers not seen in the last {len(runs)} runs...")
+    stale += legacy
+    task_id = es.delete_by_query(
+        index=index,
+        query=query,
+        conflicts="proceed",
+        requests_per_second=requests_per_second,
+        wait_for_completion=False,
+    )["task"]
+
+    while True:
+        task = es.tasks.get(task_id=task_id)
+        status = task["task"]["status"]
+        if task.get("completed"):
+            break
+        print(f"   … {status.get('deleted', 0)}/{status.get('total', stale)} deleted")
+        time.sleep(2)
+
+    failures = task.get("response", {}).get("failures") or []
+    if failures:
+        print(f"⚠️ {len(failures)} failures while sweeping {site}: {failures[:3]}")
+    print(f"✅ Swept {status.get('deleted', 0)} stale {site} offers")
+    return status.get("deleted", 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete offers a site no longer lists")
+    parser.add_argument("--index", default=os.getenv("INDEX_NAME", "competitor_offers"), help="Elasticsearch index name")
+    parser.add_argument("--site", required=True, help="Site prefix used by prepare_embeddings.py (kay, glamira, rarecarat, 1stdibs)")
+    parser.add_argument("--keep-runs", type=int, default=DEFAULT_KEEP_RUNS, help="Keep offers seen in any of the latest N runs")
+    parser.add_argument("--requests-per-second", type=float, default=DEFAULT_REQUESTS_PER_SECOND, help="delete_by_query throttle")
+    parser.add_argument("--max-sweep-ratio", type=float, default=DEFAULT_MAX_SWEEP_RATIO, help="Refuse to delete more than this share of the site's offers")
+    parser.add_argument("--legacy-source", action="append", default=[], help="Also delete docs with this source value and no site field (repeatable), e.g. 'Kay Jewellers'")
+    parser.add_argument("--host", default=None, help="Elasticsearch host URL (optional, fallback to .env)")
+    parser.add_argument("--user", default=None, help="Elasticsearch username (optional, fallback to .env)")
+    parser.add_argument("--password", default=None, help="Elasticsearch password (optional, fallback to .env)")
+
+    args = parser.parse_args()
+    es = connect(args.host, args.user, args.password)
+    sweep_stale(
+        es, args.index, args.site, args.keep_runs, args.requests_per_second, args.max_sweep_ratio, args.legacy_source
+    )
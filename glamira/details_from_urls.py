@@ -3,7 +3,7 @@ import json
 import time
 import random
 from concurrent.futures import ThreadPoolExecutor
-from queue import Queue
+from queue import Empty, Queue
 from threading import Lock
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -12,6 +12,14 @@ from selenium.webdriver.support import expected_conditions as EC
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.driver_pool import DriverPool
+from common.http_fetch import HttpFetcher, has_required_fields, json_ld_properties
+from common.readiness import wait_for_ready
+from common.resource_blocking import BlockStats, add_selenium_logging, collect_selenium_stats, enable_selenium_blocking
+from glamira.normalize_glamira import extract_attributes
 
 # --- CONFIG ---
 INPUT_CSV = "glamira/glamira_products_list.csv"      # input file with product URLs
@@ -19,10 +27,17 @@ OUTPUT_CSV = "glamira/poc_glamira_final1.csv"         # main results file
 FAILED_CSV = "glamira/failed_urls1.csv"               # failed URLs will be retried here
 MAX_RETRIES = 3                              # per URL
 NUM_THREADS = 3                              # adjust based on machine
-BATCH_SIZE = 30                              # refresh driver after this many
+BATCH_SIZE = 30                              # recycle driver after this many (only without psutil)
+BLOCK_RESOURCES = True                       # skip images/fonts/media/trackers (spec tables only)
+SITE = "glamira"
+FAST_EXTRACT = True                          # wait for the specs instead of scrolling the whole page
+READY_SELECTOR = "div.detail-content-wrap table.table-detail"
+HTTP_FIRST = True                            # try a plain GET (server HTML / JSON-LD) before Chrome
 
 lock = Lock()
 progress_lock = Lock()
+block_stats = BlockStats(SITE)
+http_fetcher = HttpFetcher(SITE, maxsize=NUM_THREADS)
 
 # --- Selenium driver setup ---
 def init_driver():
@@ -36,9 +51,17 @@ def init_driver():
     options.add_argument("--disable-extensions")
     options.add_argument("--no-sandbox")
     options.add_argument("--headless=new")
+    if FAST_EXTRACT:
+        options.page_load_strategy = "eager"  # return at DOMContentLoaded; readiness waits do the rest
+    if BLOCK_RESOURCES:
+        add_selenium_logging(options)
     driver = webdriver.Chrome(options=options)
+    if BLOCK_RESOURCES:
+        enable_selenium_blocking(driver, SITE)
     return driver
 
+driver_pool = DriverPool(init_driver, NUM_THREADS, max_pages=BATCH_SIZE)  # shared by workers and retry passes
+
 def scroll_page(driver):
     """Scroll through the page to trigger lazy loading."""
     last_height = driver.execute_script("return document.body.scrollHeight")
@@ -46,75 +69,110 @@ def scroll_page(driver):
         driver.execute_script(f"window.scrollTo(0, {y});")
         time.sleep(random.uniform(0.3, 0.6))
 
+def parse_details(soup):
+    # 🔍 Glamira product details are in .detail-content-wrap
+    detail_wraps = soup.select("div.detail-content-wrap table.data-table.table-detail")
+    product_details = {}
+
+    for table in detail_wraps:
+        # Some tables don’t have headings, so we just use "General", "Stone", etc.
+        section_title = table.find_previous("span", class_="title")
+        header = section_title.get_text(strip=True) if section_title else "Unknown Section"
+
+        rows = {}
+        for tr in table.select("tr"):
+            label = tr.select_one("td.detail-label")
+            value = tr.select_one("td.detail-value")
+            if label and value:
+                rows[label.get_text(strip=True)] = value.get_text(strip=True)
+        if rows:
+            product_details[header] = rows
+    return product_details
+
+def to_result(row, product_details):
+    return {
+        "name": row["name"],
+        "price": row.get("price", "N/A"),
+        "url": row["url"],
+        "details": json.dumps(product_details, ensure_ascii=False),
+    }
+
+def parse_http_page(html):
+    """Detail tables from the server HTML, else the JSON-LD Product properties; {} (too few specs) sends the page to Chrome."""
+    soup = BeautifulSoup(html, "html.parser")
+    product_details = parse_details(soup)
+    if not product_details and (props := json_ld_properties(soup)):
+        product_details["General"] = props
+    # only trust the page if the normalizer gets the metal and a few specs out of it
+    if not has_required_fields(extract_attributes(json.dumps(product_details))):
+        return {}
+    return product_details
+
+def fetch_over_http(row):
+    product_details = http_fetcher.fetch(row["url"], parse_http_page)
+    return to_result(row, product_details) if product_details else None
+
 def scrape_single_product(driver, row):
     url = row["url"]
     for attempt in range(1, MAX_RETRIES + 1):
         try:
             driver.get(url)
-            WebDriverWait(driver, 15).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-
-            scroll_page(driver)
-
-            soup = BeautifulSoup(driver.page_source, "html.parser")
-
-            # 🔍 Glamira product details are in .detail-content-wrap
-            detail_wraps = soup.select("div.detail-content-wrap table.data-table.table-detail")
-            product_details = {}
-
-            for table in detail_wraps:
-                # Some tables don’t have headings, so we just use "General", "Stone", etc.
-                section_title = table.find_previous("span", class_="title")
-                header = section_title.get_text(strip=True) if section_title else "Unknown Section"
+            if FAST_EXTRACT:
+                if not wait_for_ready(driver, READY_SELECTOR):
+                    raise ValueError("Details section never rendered")
+            else:
+                WebDriverWait(driver, 15).until(
+                    EC.presence_of_element_located((By.TAG_NAME, "body"))
+                )
+                scroll_page(driver)
 
-                rows = {}
-                for tr in table.select("tr"):
-                    label = tr.select_one("td.detail-label")
-                    value = tr.select_one("td.detail-value")
-                    if label and value:
-                        rows[label.get_text(strip=True)] = value.get_text(strip=True)
-                if rows:
-                    product_details[header] = rows
+            product_details = parse_details(BeautifulSoup(driver.page_source, "html.parser"))
 
             if not product_details:
                 raise ValueError("No product details extracted")
 
-            return {
-                "name": row["name"],
-                "price": row.get("price", "N/A"),
-                "url": url,
-                "details": json.dumps(product_details, ensure_ascii=False),
-            }
+            return to_result(row, product_details)
 
         except Exception as e:
             print(f"❌ {url} attempt {attempt} failed: {e}")
             time.sleep(random.uniform(1, 2))
     return None
 
-def worker(queue: Queue, writer, failed_writer, pbar):
-    processed = 0
-    driver = init_driver()
-    while not queue.empty():
-        row = queue.get()
-        result = scrape_single_product(driver, row)
-
-        with lock:
-            if result:
-                writer.writerow(result)
-            else:
-                failed_writer.writerow(row)
-
-        with progress_lock:
-            pbar.update(1)
-
-        processed += 1
-        queue.task_done()
+def scrape_row(row):
+    result = fetch_over_http(row) if HTTP_FIRST else None
+    if result is None:
+        driver = driver_pool.acquire()
+        try:
+            result = scrape_single_product(driver, row)
+            if BLOCK_RESOURCES:
+                collect_selenium_stats(driver, block_stats)
+        finally:
+            driver_pool.release(driver, ok=result is not None)
+    return result
 
-        if processed % BATCH_SIZE == 0:
-            driver.quit()
-            driver = init_driver()
-    driver.quit()
+def worker(queue: Queue, writer, failed_writer, pbar):
+    while True:
+        try:
+            row = queue.get_nowait()
+        except Empty:
+            return
+        try:
+            try:
+                result = scrape_row(row)
+            except Exception as e:  # e.g. Chrome failed to start: the row is retried in the next pass
+                print(f"❌ {row.get('url')} failed outside the page: {e}")
+                result = None
+
+            with lock:
+                if result:
+                    writer.writerow(result)
+                else:
+                    failed_writer.writerow(row)
+
+            with progress_lock:
+                pbar.update(1)
+        finally:
+            queue.task_done()  # always, or task_queue.join() would wait forever
 
 def process_csv(csv_file, output_file, failed_file):
     if not os.path.exists(csv_file) or os.path.getsize(csv_file) == 0:
@@ -145,12 +203,20 @@ def process_csv(csv_file, output_file, failed_file):
         pbar = tqdm(total=len(reader), desc=f"Processing {os.path.basename(csv_file)}", ncols=100)
 
         with ThreadPoolExecutor(max_workers=NUM_THREADS) as executor:
-            for _ in range(NUM_THREADS):
-                executor.submit(worker, task_queue, writer, failed_writer, pbar)
+            futures = [executor.submit(worker, task_queue, writer, failed_writer, pbar) for _ in range(NUM_THREADS)]
 
+        # the executor has waited for every worker: re-raise whatever killed one before join(),
+        # which would otherwise block forever on the rows it never reached
+        for future in futures:
+            future.result()
         task_queue.join()
         pbar.close()
 
+    if BLOCK_RESOURCES:
+        block_stats.summary()
+    if HTTP_FIRST:
+        http_fetcher.summary()
+
 if __name__ == "__main__":
     process_csv(INPUT_CSV, OUTPUT_CSV, FAILED_CSV)
 
@@ -164,4 +230,5 @@ if __name__ == "__main__":
             print("⚠️ Max retry attempts reached. Some URLs may still fail.")
             break
 
+    driver_pool.close()
     print(f"\n🎉 All done! Results → {OUTPUT_CSV}, remaining failed URLs → {FAILED_CSV}")
@@ -178,20 +178,37 @@
 
 import pandas as pd
 import json
-from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
-from elasticsearch import Elasticsearch, helpers
-from elasticsearch.helpers import BulkIndexError
+from elasticsearch import Elasticsearch
 import re
 import os
 import argparse
+import sys
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.backup import VECTOR_FORMATS
+from common.bulk_indexer import DEFAULT_TARGET_LATENCY, BulkIndexer
+from common.dead_letter import DeadLetterQueue
+from common.backends import BACKENDS, cache_model_key
+from common.doc_ids import content_hash, offer_id
+from common.embedding_cache import EmbeddingCache
+from common.encoding import DEFAULT_TOKEN_BUDGET, ProcessPoolEncoder, open_encoder_in_background
+from common.es_index import create_generation, ensure_index, load_mode, promote_generation
+from common.indexing import iter_encoded_actions, skip_unchanged, stream_index
+from common.sweeper import DEFAULT_KEEP_RUNS, DEFAULT_REQUESTS_PER_SECOND, doc_sources, record_run, refresh_stamps, run_stamp, sweep_stale
+
 # --------------------------
 # Load environment variables
 # --------------------------
 load_dotenv()  # loads variables from .env
 
+INDEX_SOURCE = "glamira"  # doc ID prefix; blue/green generations are named <index>-glamira-<timestamp>
+
+REQUIRED_COLUMNS = [
+    "name", "price", "url", "stone_type", "stone_shape", "stone_clarity", "stone_color",
+    "stone_carat_weight", "metal_type", "metal_color", "gold_karat", "ring_size", "source",
+]
+
 # --------------------------
 # Helper functions
 # --------------------------
@@ -260,11 +277,12 @@ def infer_category(row):
 # Main
 # --------------------------
 def main(args):
-    print("Loading embedding model...")
-    model = SentenceTransformer(args.model)
-
-    print(f"Loading CSV: {args.input}")
-    df = pd.read_csv(args.input)
+    # Fail fast: check the input and the cluster before paying for the model load
+    if not os.path.exists(args.input):
+        raise FileNotFoundError(f"❌ Input CSV not found: {args.input}")
+    missing_columns = set(REQUIRED_COLUMNS) - set(pd.read_csv(args.input, nrows=0).columns)
+    if missing_columns:
+        raise ValueError(f"❌ {args.input} is missing columns: {sorted(missing_columns)}")
 
     print("Connecting to Elasticsearch...")
 
@@ -286,54 +304,112 @@ def main(args):
         raise RuntimeError("❌ Could not connect to Elasticsearch!")
     print("✅ Connected to Elasticsearch")
 
-    actions = []
-    with open(args.output, "w", encoding="utf-8") as f_ndjson:
-        for idx, row in tqdm(df.iterrows(), total=len(df)):
-            doc_id = f"glamira-{idx+1}"
-            text = build_text(row)
-            embedding = model.encode(text, normalize_embeddings=True).tolist()
-
-            doc = {
-                "name": safe_str(row.get("name")),
-                "price": normalize_price(row.get("price")),
-                "url": safe_str(row.get("url")),
-                "stone_type": safe_str(row.get("stone_type")),
-                "stone_shape": safe_str(row.get("stone_shape")),
-                "stone_clarity": safe_str(row.get("stone_clarity")),
-                "stone_color": safe_str(row.get("stone_color")),
-                "stone_carat_weight": row.get("stone_carat_weight") if not pd.isna(row.get("stone_carat_weight")) else None,
-                "metal_type": safe_str(row.get("metal_type")),
-                "metal_color": safe_str(row.get("metal_color")),
-                "gold_karat": normalize_gold_karat(row.get("gold_karat")),
-                "ring_size": normalize_ring_size(row.get("ring_size")),
-                "category": infer_category(row),
-                "source": safe_str(row.get("source")),
-                "embedding": embedding,
-            }
-
-            action = {
-                "_op_type": "update",
-                "_index": args.index,
-                "_id": doc_id,
-                "doc": doc,
-                "doc_as_upsert": True
-            }
-            actions.append(action)
-
-            f_ndjson.write(json.dumps({"update": {"_index": args.index, "_id": doc_id}}) + "\n")
-            f_ndjson.write(json.dumps({"doc": doc, "doc_as_upsert": True}) + "\n")
-
-    print("Uploading to Elasticsearch...")
-    try:
-        helpers.bulk(es, actions)
+    # Blue/green: load a fresh generation and only move the alias once its doc count checks out
+    if args.blue_green:
+        index_name = create_generation(es, args.index, INDEX_SOURCE)
+    else:
+        ensure_index(es, args.index)
+        index_name = args.index
+
+    # Load the model on a background thread while pandas parses and normalizes the CSV
+    model_future = open_encoder_in_background(
+        args.model, args.backend, args.service_url, args.encode_workers, args.token_budget
+    )
+
+    print(f"Loading CSV: {args.input}")
+    df = pd.read_csv(args.input)
+
+    model_key = cache_model_key(args.model, args.backend)
+    stamp = run_stamp(INDEX_SOURCE)
+    items = []
+    for _, row in df.iterrows():
+        doc = {
+            "name": safe_str(row.get("name")),
+            "price": normalize_price(row.get("price")),
+            "url": safe_str(row.get("url")),
+            "stone_type": safe_str(row.get("stone_type")),
+            "stone_shape": safe_str(row.get("stone_shape")),
+            "stone_clarity": safe_str(row.get("stone_clarity")),
+            "stone_color": safe_str(row.get("stone_color")),
+            "stone_carat_weight": row.get("stone_carat_weight") if not pd.isna(row.get("stone_carat_weight")) else None,
+            "metal_type": safe_str(row.get("metal_type")),
+            "metal_color": safe_str(row.get("metal_color")),
+            "gold_karat": normalize_gold_karat(row.get("gold_karat")),
+            "ring_size": normalize_ring_size(row.get("ring_size")),
+            "category": infer_category(row),
+            "source": safe_str(row.get("source")),
+            "site": INDEX_SOURCE,
+        }
+        text = build_text(row)
+        doc["content_hash"] = content_hash(doc, model_key, text)
+        doc.update(stamp)
+        doc_id = offer_id(INDEX_SOURCE, doc["url"], text)
+
+        action = {
+            "_op_type": "update",
+            "_index": index_name,
+            "_id": doc_id,
+            "doc": doc,
+            "doc_as_upsert": True
+        }
+        items.append((text, action))
+
+    seen_ids = list(dict.fromkeys(action["_id"] for _, action in items))
+    sources = doc_sources(items)
+    unchanged = []
+    if not args.reindex_all:
+        items, unchanged = skip_unchanged(es, index_name, items)
+        refresh_stamps(es, unchanged)
+
+    model = model_future.result()
+
+    cache = None
+    if not args.no_cache:
+        cache = EmbeddingCache(args.cache_path, model_key, args.cache_max_entries)
+
+    print("Encoding + uploading to Elasticsearch...")
+    actions = iter_encoded_actions(model, items, args.batch_size, cache, args.encode_chunk, args.queue_size)
+    indexer = BulkIndexer(
+        es,
+        threads=args.index_threads,
+        chunk_size=args.chunk_size,
+        max_bytes=args.max_bytes,
+        max_retries=args.max_retries,
+        adaptive=not args.fixed_chunk_size,
+        target_latency=args.target_latency,
+        dead_letter=DeadLetterQueue(args.dead_letter_dir or f"{args.output}_dead_letter"),
+    )
+    with load_mode(es, index_name, enabled=args.load_mode, force_merge_segments=args.force_merge):
+        uploaded_count, errors = stream_index(indexer, actions, args.output, total=len(items), vector_format=args.vector_format, unchanged=unchanged)
+
+    if cache is not None:
+        cache.close()
+    if isinstance(model, ProcessPoolEncoder):
+        model.close()
+
+    if not errors:
         print("✅ All documents upserted successfully!")
-    except BulkIndexError as e:
-        failed_count = len(e.errors)
+    else:
+        failed_count = len(errors)
         print(f"❌ {failed_count} documents failed to upsert.")
         with open(f"{args.output}_failed.json", "w", encoding="utf-8") as f:
-            json.dump(e.errors, f, indent=2)
+            json.dump(errors, f, indent=2)
         print("💾 Saved failed docs for inspection.")
 
+    if args.blue_green:
+        if errors:
+            print(f"⚠️ Kept {index_name} for inspection; alias {args.index} left unchanged")
+        else:
+            promote_generation(
+                es, args.index, INDEX_SOURCE, index_name, len({action["_id"] for _, action in items}), args.keep_generations
+            )
+
+    if not errors:
+        # The manifest lists every offer this run saw, including ones skipped as unchanged
+        record_run(es, args.index, INDEX_SOURCE, stamp["run_id"], seen_ids)
+        if args.sweep and not args.blue_green:
+            sweep_stale(es, args.index, INDEX_SOURCE, args.keep_runs, args.sweep_rps, legacy_sources=sources)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Glamira embeddings + Elasticsearch upload")
 
@@ -343,8 +419,34 @@ if __name__ == "__main__":
     required=True,
     help="Output NDJSON file (pipeline should provide full path)"
 )
+    parser.add_argument("--vector-format", choices=VECTOR_FORMATS, default="json", help="Backup embeddings inline as JSON or in a float32/float16 .npy sidecar")
+    parser.add_argument("--dead-letter-dir", default=None, help="Where failed docs (source + embedding) are kept for retry-failed (default: <output>_dead_letter)")
     parser.add_argument("--index", default="competitor_offers_test", help="Output NDJSON file (pipeline should provide full path)")
     parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2", help="SentenceTransformer model")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch", help="Inference backend (onnx-int8 = exported, quantized model on CPU)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Number of texts encoded per model batch")
+    parser.add_argument("--token-budget", type=int, default=DEFAULT_TOKEN_BUDGET, help="Padded tokens per length-bucketed batch (0 = fixed --batch-size batches)")
+    parser.add_argument("--encode-workers", type=int, default=1, help="Encoder processes, each with its own model copy (1 = in-process)")
+    parser.add_argument("--service-url", default=None, help="Embedding service URL (optional, fallback to .env); used instead of a local model when reachable")
+    parser.add_argument("--encode-chunk", type=int, default=512, help="Texts encoded per pipeline chunk before handing off to the uploader")
+    parser.add_argument("--queue-size", type=int, default=4, help="Encoded chunks allowed to wait for upload")
+    parser.add_argument("--index-threads", type=int, default=4, help="Parallel bulk requests in flight")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Starting docs per bulk request (adapted to --target-latency)")
+    parser.add_argument("--max-bytes", type=int, default=10 * 1024 * 1024, help="Max bytes per bulk request")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries with exponential backoff for 429/503 rejections")
+    parser.add_argument("--target-latency", type=float, default=DEFAULT_TARGET_LATENCY, help="Seconds per bulk request the adaptive chunk size aims for")
+    parser.add_argument("--fixed-chunk-size", action="store_true", help="Keep --chunk-size fixed instead of adapting it")
+    parser.add_argument("--load-mode", action="store_true", help="Disable refresh and replicas on the index during the upload (restored afterwards)")
+    parser.add_argument("--force-merge", type=int, default=None, help="With --load-mode: force-merge to this many segments after the upload")
+    parser.add_argument("--blue-green", action="store_true", help="Load into a new timestamped index and swap the --index alias to it once verified")
+    parser.add_argument("--keep-generations", type=int, default=2, help="With --blue-green: generations of this source to retain (including the live one)")
+    parser.add_argument("--reindex-all", action="store_true", help="Write every offer, even if its content hash matches the indexed copy")
+    parser.add_argument("--sweep", action="store_true", help="After a clean run, delete offers not seen in the last --keep-runs runs")
+    parser.add_argument("--keep-runs", type=int, default=DEFAULT_KEEP_RUNS, help="Runs an offer may be missing from before --sweep deletes it")
+    parser.add_argument("--sweep-rps", type=float, default=DEFAULT_REQUESTS_PER_SECOND, help="delete_by_query requests_per_second throttle for --sweep")
+    parser.add_argument("--cache-path", default=None, help="SQLite embedding cache path (optional, fallback to .env)")
+    parser.add_argument("--cache-max-entries", type=int, default=None, help="Max cached vectors before LRU eviction (optional, fallback to .env)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the embedding cache and re-encode every row")
     parser.add_argument("--host", default=None, help="Elasticsearch host (optional, fallback to .env)")
     parser.add_argument("--user", default=None, help="Elasticsearch username (optional, fallback to .env)")
     parser.add_argument("--password", default=None, help="Elasticsearch password (optional, fallback to .env)")
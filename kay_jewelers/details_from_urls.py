@@ -3,7 +3,7 @@ import json
 import time
 import random
 from concurrent.futures import ThreadPoolExecutor
-from queue import Queue
+from queue import Empty, Queue
 from threading import Lock
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -12,6 +12,14 @@ from selenium.webdriver.support import expected_conditions as EC
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.driver_pool import DriverPool
+from common.http_fetch import HttpFetcher, has_required_fields, json_ld_properties
+from common.readiness import wait_for_ready
+from common.resource_blocking import BlockStats, add_selenium_logging, collect_selenium_stats, enable_selenium_blocking
+from kay_jewelers.normalize_dataset import extract_attributes
 
 # --- CONFIG ---
 INPUT_CSV = "kay_jewelers/products_list.csv"              # input file with product URLs
@@ -19,10 +27,18 @@ OUTPUT_CSV = "kay_jewelers/poc_kay_final.csv"             # main results file
 FAILED_CSV = "kay_jewelers/failed_urls.csv"               # failed URLs will be retried here
 MAX_RETRIES = 3                              # per URL
 NUM_THREADS = 3                              # adjust based on machine
-BATCH_SIZE = 30                              # refresh driver after this many
+BATCH_SIZE = 30                              # recycle driver after this many (only without psutil)
+BLOCK_RESOURCES = True                       # skip images/fonts/media/trackers (spec tables only)
+SITE = "kay"
+FAST_EXTRACT = True                          # wait for the specs instead of scrolling the whole page
+READY_SELECTOR = "table.specs-table, button#Details"
+SPECS_SELECTOR = "table.specs-table"
+HTTP_FIRST = True                            # try a plain GET (server HTML / JSON-LD) before Chrome
 
 lock = Lock()
 progress_lock = Lock()
+block_stats = BlockStats(SITE)
+http_fetcher = HttpFetcher(SITE, maxsize=NUM_THREADS)
 
 # --- Selenium driver setup ---
 def init_driver():
@@ -40,10 +56,18 @@ def init_driver():
     options.add_experimental_option("excludeSwitches", ["enable-automation"])
     options.add_experimental_option('useAutomationExtension', False)
     options.add_argument("--headless=new")
+    if FAST_EXTRACT:
+        options.page_load_strategy = "eager"  # return at DOMContentLoaded; readiness waits do the rest
+    if BLOCK_RESOURCES:
+        add_selenium_logging(options)
     driver = webdriver.Chrome(options=options)
+    if BLOCK_RESOURCES:
+        enable_selenium_blocking(driver, SITE)
     return driver
 
 
+driver_pool = DriverPool(init_driver, NUM_THREADS, max_pages=BATCH_SIZE)  # shared by workers and retry passes
+
 def scroll_into_view_safely(driver, element):
     driver.execute_script(
         "arguments[0].scrollIntoView({behavior:'smooth', block:'center'});"
@@ -66,79 +90,124 @@ def expand_details(driver):
     except:
         return False
 
+def open_details(driver):
+    """Fast mode: JS-click the Details accordion if it's collapsed and wait for its tables."""
+    driver.execute_script(
+        "const b = document.querySelector('button#Details');"
+        "if (b && b.getAttribute('aria-expanded') === 'false') b.click();"
+    )
+    return wait_for_ready(driver, SPECS_SELECTOR, timeout=5, probe=5)
+
+def parse_specs(soup):
+    product_details = {}
+    for table in soup.find_all("table", class_="specs-table"):
+        header = (
+            table.find("thead").get_text(strip=True)
+            if table.find("thead")
+            else "Unknown Section"
+        )
+        items = {
+            tds[0].get_text(strip=True): tds[1].get_text(strip=True)
+            for tr in table.find_all("tr")
+            if (tds := tr.find_all("td")) and len(tds) >= 2
+        }
+        if items:
+            product_details[header] = items
+    return product_details
+
+def to_result(row, product_details):
+    return {
+        "name": row.get("name", "N/A"),
+        "price": row.get("price", "N/A"),
+        "url": row["url"],
+        "details": json.dumps(product_details, ensure_ascii=False),
+    }
+
+def parse_http_page(html):
+    """Specs from server-rendered tables, else the JSON-LD Product properties; {} (too few specs) sends the page to Chrome."""
+    soup = BeautifulSoup(html, "html.parser")
+    product_details = parse_specs(soup)
+    if not product_details and (props := json_ld_properties(soup)):
+        product_details["Details"] = props
+    # only trust the page if the normalizer gets the metal and a few specs out of it
+    if not has_required_fields(extract_attributes(json.dumps(product_details))):
+        return {}
+    return product_details
+
+def fetch_over_http(row):
+    product_details = http_fetcher.fetch(row["url"], parse_http_page)
+    return to_result(row, product_details) if product_details else None
+
 def scrape_single_product(driver, row):
     url = row["url"]
     for attempt in range(1, MAX_RETRIES + 1):
         try:
             driver.get(url)
-            WebDriverWait(driver, 15).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-
-            # scroll bottom to load dynamic content
-            last_height = driver.execute_script("return document.body.scrollHeight")
-            for y in range(0, last_height, 400):
-                driver.execute_script(f"window.scrollTo(0, {y});")
-                time.sleep(random.uniform(0.3, 0.6))
-
-            expand_details(driver)
-
-            soup = BeautifulSoup(driver.page_source, "html.parser")
-            tables = soup.find_all("table", class_="specs-table")
-            product_details = {}
-            for table in tables:
-                header = (
-                    table.find("thead").get_text(strip=True)
-                    if table.find("thead")
-                    else "Unknown Section"
+            if FAST_EXTRACT:
+                if not wait_for_ready(driver, READY_SELECTOR):
+                    raise ValueError("Details section never rendered")
+                open_details(driver)
+            else:
+                WebDriverWait(driver, 15).until(
+                    EC.presence_of_element_located((By.TAG_NAME, "body"))
                 )
-                items = {
-                    tds[0].get_text(strip=True): tds[1].get_text(strip=True)
-                    for tr in table.find_all("tr")
-                    if (tds := tr.find_all("td")) and len(tds) >= 2
-                }
-                if items:
-                    product_details[header] = items
+
+                # scroll bottom to load dynamic content
+                last_height = driver.execute_script("return document.body.scrollHeight")
+                for y in range(0, last_height, 400):
+                    driver.execute_script(f"window.scrollTo(0, {y});")
+                    time.sleep(random.uniform(0.3, 0.6))
+
+                expand_details(driver)
+
+            product_details = parse_specs(BeautifulSoup(driver.page_source, "html.parser"))
 
             # 🚨 If no details found, mark as failure
             if not product_details:
                 raise ValueError("No product details extracted")
 
-            return {
-                "name": row.get("name", "N/A"),
-                "price": row.get("price", "N/A"),
-                "url": url,
-                "details": json.dumps(product_details, ensure_ascii=False),
-            }
+            return to_result(row, product_details)
 
         except Exception as e:
             print(f"❌ {url} attempt {attempt} failed: {e}")
             time.sleep(random.uniform(1, 2))
     return None
 
-def worker(queue: Queue, writer, failed_writer, pbar):
-    processed = 0
-    driver = init_driver()
-    while not queue.empty():
-        row = queue.get()
-        result = scrape_single_product(driver, row)
-
-        with lock:
-            if result:
-                writer.writerow(result)
-            else:
-                failed_writer.writerow(row)
+def scrape_row(row):
+    result = fetch_over_http(row) if HTTP_FIRST else None
+    if result is None:
+        driver = driver_pool.acquire()
+        try:
+            result = scrape_single_product(driver, row)
+            if BLOCK_RESOURCES:
+                collect_selenium_stats(driver, block_stats)
+        finally:
+            driver_pool.release(driver, ok=result is not None)
+    return result
 
-        with progress_lock:
-            pbar.update(1)
+def worker(queue: Queue, writer, failed_writer, pbar):
+    while True:
+        try:
+            row = queue.get_nowait()
+        except Empty:
+            return
+        try:
+            try:
+                result = scrape_row(row)
+            except Exception as e:  # e.g. Chrome failed to start: the row is retried in the next pass
+                print(f"❌ {row.get('url')} failed outside the page: {e}")
+                result = None
 
-        processed += 1
-        queue.task_done()
+            with lock:
+                if result:
+                    writer.writerow(result)
+                else:
+                    failed_writer.writerow(row)
 
-        if processed % BATCH_SIZE == 0:
-            driver.quit()
-            driver = init_driver()
-    driver.quit()
+            with progress_lock:
+                pbar.update(1)
+        finally:
+            queue.task_done()  # always, or task_queue.join() would wait forever
 
 def process_csv(csv_file, output_file, failed_file):
     if not os.path.exists(csv_file) or os.path.getsize(csv_file) == 0:
@@ -169,12 +238,20 @@ def process_csv(csv_file, output_file, failed_file):
         pbar = tqdm(total=len(reader), desc=f"Processing {os.path.basename(csv_file)}", ncols=100)
 
         with ThreadPoolExecutor(max_workers=NUM_THREADS) as executor:
-            for _ in range(NUM_THREADS):
-                executor.submit(worker, task_queue, writer, failed_writer, pbar)
+            futures = [executor.submit(worker, task_queue, writer, failed_writer, pbar) for _ in range(NUM_THREADS)]
 
+        # the executor has waited for every worker: re-raise whatever killed one before join(),
+        # which would otherwise block forever on the rows it never reached
+        for future in futures:
+            future.result()
         task_queue.join()
         pbar.close()
 
+    if BLOCK_RESOURCES:
+        block_stats.summary()
+    if HTTP_FIRST:
+        http_fetcher.summary()
+
 if __name__ == "__main__":
     # 1️⃣ Process main CSV
     process_csv(INPUT_CSV, OUTPUT_CSV, FAILED_CSV)
@@ -189,4 +266,5 @@ if __name__ == "__main__":
             print("⚠️ Max retry attempts reached. Some URLs may still fail.")
             break
 
+    driver_pool.close()
     print(f"\n🎉 All done! Results → {OUTPUT_CSV}, remaining failed URLs → {FAILED_CSV}")
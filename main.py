@@ -417,17 +417,20 @@ import re
 import ast
 import math
 import streamlit as st
-from sentence_transformers import SentenceTransformer
 from elasticsearch import Elasticsearch
 from typing import Any, Dict, Optional
 from dotenv import load_dotenv
 
+from common.backends import load_embedding_model
+from common.embedding_service import connect_embedding_service
+
 # --------------------------
 # Config via .env
 # --------------------------
 load_dotenv()
 
 MODEL_NAME = os.getenv("MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # or onnx-int8
 INDEX_NAME = os.getenv("INDEX_NAME", "competitor_offers")
 ES_HOST = os.getenv("ES_HOST", "https://localhost:9200")
 ES_USER = os.getenv("ES_USER", "elastic")
@@ -441,7 +444,9 @@ if not ES_PASS:
 # --------------------------
 @st.cache_resource
 def load_model():
-    return SentenceTransformer(MODEL_NAME)
+    # Prefer the warm host-wide embedding service; fall back to loading the model in-process
+    service = connect_embedding_service(None, MODEL_NAME, EMBEDDING_BACKEND)
+    return service or load_embedding_model(MODEL_NAME, EMBEDDING_BACKEND)
 
 @st.cache_resource
 def connect_es():
@@ -711,7 +716,7 @@ def search_similar(es, embedding, normalized, tolerance, k=10):
     if gold_karat:
         filters.append({"term": {"gold_karat": gold_karat}})
     if category:
-        filters.append({"term": {"category.keyword": category}})
+        filters.append({"term": {"category": category}})
 
     knn_query = {
         "field": "embedding",
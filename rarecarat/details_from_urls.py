@@ -204,14 +204,25 @@
 #     print(f"\n🎉 All done! Results → {OUTPUT_CSV}, remaining failed URLs → {FAILED_CSV}")
 
 
+import argparse
 import asyncio
 import csv
 import json
 import random
+import time
 from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.browser_pool import BrowserPool
+from common.driver_pool import DEFAULT_MAX_ERROR_RATE, DEFAULT_MAX_RSS_MB
+from common.http_fetch import HttpFetcher, has_required_fields, json_ld_properties
+from common.readiness import wait_for_ready_async
+from common.resource_blocking import BlockStats, enable_playwright_blocking
+from rarecarat.normalize_rarecarat import extract_attributes
 
 # --- CONFIG ---
 INPUT_CSV = "rarecarat/products_list.csv"
@@ -219,11 +230,121 @@ OUTPUT_CSV = "rarecarat/product_details.csv"
 FAILED_CSV = "rarecarat/failed_urls.csv"
 
 MAX_RETRIES = 3
-CONCURRENT_PAGES = 10  # number of parallel pages
+CONCURRENT_PAGES = 10  # page slots; each pulls the next URL as soon as it's done
+BROWSER_CONTEXTS = 2   # slots are spread over this many contexts (separate cookies/cache)
 INITIAL_WAIT = 3       # seconds, first attempt
 RETRY_WAIT = 8         # seconds, for retries
+BLOCK_RESOURCES = True # skip images/fonts/media/trackers (specs only)
+SITE = "rarecarat"
+FAST_EXTRACT = True    # wait for the spec items instead of sleeping INITIAL_WAIT/RETRY_WAIT
+READY_SELECTOR = "div.q-item--clickable, div.product-faq-item"  # expanders or already-open items
+SPECS_SELECTOR = "div.product-faq-item"  # only rendered once the expanders are open
+READY_TIMEOUT = 10     # seconds, first attempt (fast mode)
+RETRY_READY_TIMEOUT = 20
+HTTP_FIRST = True      # try a plain GET (server HTML / JSON-LD) before Playwright
+HTTP_MIN_FIELDS = 4    # normalized fields an HTTP page must yield: stone_type is always set and the
+                       # metal line gives metal_type + gold_karat, so at least one spec item
+MAX_BROWSER_RSS_MB = DEFAULT_MAX_RSS_MB          # relaunch Chromium past this (needs psutil)
+MAX_CONTEXT_ERROR_RATE = DEFAULT_MAX_ERROR_RATE  # recreate a context when this share of its last pages failed
 
 lock = asyncio.Lock()
+block_stats = BlockStats(SITE)
+http_fetcher = HttpFetcher(SITE, maxsize=CONCURRENT_PAGES)
+
+# --- Optional live indexing (--index): offers are encoded and indexed while scraping continues ---
+def open_live_sink(args):
+    from normalize_rarecarat import extract_attributes, infer_category
+    from prepare_embeddings import INDEX_SOURCE, build_item  # also puts the repo root on sys.path
+
+    from common.async_sink import AsyncIndexSink, connect_async
+    from common.backends import cache_model_key
+    from common.dead_letter import DeadLetterQueue
+    from common.embedding_cache import EmbeddingCache
+    from common.encoding import open_encoder_in_background
+    from common.es_index import connect, ensure_index
+    from common.sweeper import run_stamp
+
+    host = args.host or os.getenv("ES_HOST")
+    user = args.user or os.getenv("ES_USER")
+    password = args.password or os.getenv("ES_PASSWORD")
+    ensure_index(connect(host, user, password), args.index)
+
+    model_key = cache_model_key(args.model, args.backend)
+    stamp = run_stamp(INDEX_SOURCE)
+    sink = AsyncIndexSink(
+        connect_async(host, user, password),
+        open_encoder_in_background(args.model, args.backend, args.service_url),
+        cache=EmbeddingCache(None, model_key),
+        max_in_flight=args.max_in_flight,
+        dead_letter=DeadLetterQueue("rarecarat/live_dead_letter"),
+    )
+
+    def to_item(result):
+        # same normalization as normalize_rarecarat.py + prepare_embeddings.py, one row at a time
+        row = {
+            "name": result["name"],
+            "price": result["price"],
+            "url": result["url"],
+            **extract_attributes(result["details"]),
+            "category": infer_category(result),
+            "source": "rarecarat",
+        }
+        return build_item(row, args.index, model_key, stamp)
+
+    return sink, to_item
+
+def parse_details(soup):
+    details = {}
+
+    # Gold / Metal
+    metal_info = soup.select_one("p.ng-mt-16 span.ng-text-18-24")
+    if metal_info:
+        metal_text = metal_info.get_text(strip=True)
+        if " " in metal_text:
+            gold_carat, metal_type = metal_text.split(" ", 1)
+        else:
+            gold_carat, metal_type = metal_text, ""
+        details["gold_carat"] = gold_carat
+        details["metal_type"] = metal_type
+
+    # Product details from collapsible section
+    for item in soup.select("div.product-faq-item"):
+        try:
+            key = item.find_all("div")[0].get_text(strip=True).rstrip(":")
+            value = item.find_all("div")[1].get_text(strip=True)
+            details[key] = value
+        except:
+            continue
+    return details
+
+def to_result(row, details):
+    return {
+        "name": row.get("name", "N/A"),
+        "price": row.get("price", "N/A"),
+        "url": row["url"],
+        "details": json.dumps(details, ensure_ascii=False)
+    }
+
+def parse_http_page(html):
+    """Spec items from the server HTML (plus JSON-LD Product properties); {} sends the page to Playwright."""
+    soup = BeautifulSoup(html, "html.parser")
+    details = {**json_ld_properties(soup), **parse_details(soup)}
+    # judged on what the normalizer maps, so unrelated JSON-LD properties (Brand, sku) don't count
+    attrs = extract_attributes(json.dumps(details))
+    return details if has_required_fields(attrs, min_fields=HTTP_MIN_FIELDS) else {}
+
+async def scrape_row(pool, slot, row, retry=False):
+    if HTTP_FIRST:
+        details = await asyncio.to_thread(http_fetcher.fetch, row["url"], parse_http_page)
+        if details:
+            return to_result(row, details)
+    result = None
+    try:
+        result = await extract_product_details(await pool.page(slot), row, retry)
+    finally:
+        await pool.release(slot, ok=result is not None)
+    block_stats.add(pages=1)
+    return result
 
 async def extract_product_details(page, row, retry=False):
     url = row["url"]
@@ -231,9 +352,14 @@ async def extract_product_details(page, row, retry=False):
 
     for attempt in range(1, MAX_RETRIES + 1):
         try:
-            await page.goto(url, timeout=60000)
-            await page.wait_for_load_state("domcontentloaded", timeout=60000)
-            await asyncio.sleep(wait_time + random.uniform(0.2, 0.5))
+            if FAST_EXTRACT:
+                await page.goto(url, timeout=60000, wait_until="domcontentloaded")
+                if not await wait_for_ready_async(page, READY_SELECTOR, RETRY_READY_TIMEOUT if retry else READY_TIMEOUT):
+                    raise ValueError("Spec sections never rendered")
+            else:
+                await page.goto(url, timeout=60000)
+                await page.wait_for_load_state("domcontentloaded", timeout=60000)
+                await asyncio.sleep(wait_time + random.uniform(0.2, 0.5))
 
             # Expand collapsible sections
             expand_buttons = await page.query_selector_all("div.q-item--clickable")
@@ -242,45 +368,20 @@ async def extract_product_details(page, row, retry=False):
                 if aria_expanded == "false":
                     try:
                         await btn.click()
-                        await asyncio.sleep(0.3 + random.random() * 0.2)
+                        if not FAST_EXTRACT:
+                            await asyncio.sleep(0.3 + random.random() * 0.2)
                     except:
                         continue
+            if FAST_EXTRACT and not await wait_for_ready_async(page, SPECS_SELECTOR, timeout=5, probe=5):
+                raise ValueError("Spec items never rendered after expanding")
 
-            content = await page.content()
-            soup = BeautifulSoup(content, "html.parser")
-
-            details = {}
-
-            # Gold / Metal
-            metal_info = soup.select_one("p.ng-mt-16 span.ng-text-18-24")
-            if metal_info:
-                metal_text = metal_info.get_text(strip=True)
-                if " " in metal_text:
-                    gold_carat, metal_type = metal_text.split(" ", 1)
-                else:
-                    gold_carat, metal_type = metal_text, ""
-                details["gold_carat"] = gold_carat
-                details["metal_type"] = metal_type
-
-            # Product details from collapsible section
-            for item in soup.select("div.product-faq-item"):
-                try:
-                    key = item.find_all("div")[0].get_text(strip=True).rstrip(":")
-                    value = item.find_all("div")[1].get_text(strip=True)
-                    details[key] = value
-                except:
-                    continue
+            details = parse_details(BeautifulSoup(await page.content(), "html.parser"))
 
             if len(details) <= 2:
                 # Only gold/metal info → mark for retry
                 return None
 
-            return {
-                "name": row.get("name", "N/A"),
-                "price": row.get("price", "N/A"),
-                "url": url,
-                "details": json.dumps(details, ensure_ascii=False)
-            }
+            return to_result(row, details)
 
         except PlaywrightTimeoutError:
             print(f"⏱ Timeout: {url} attempt {attempt}")
@@ -290,33 +391,67 @@ async def extract_product_details(page, row, retry=False):
         await asyncio.sleep(random.uniform(1, 2))
     return None
 
-async def worker(task_queue, writer, failed_writer, pbar, retry=False):
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        pages = [await browser.new_page() for _ in range(CONCURRENT_PAGES)]
-
-        while task_queue:
-            tasks = []
-            current_rows = []
-            for page in pages:
-                if not task_queue:
-                    break
-                row = task_queue.pop(0)
-                current_rows.append(row)
-                tasks.append(extract_product_details(page, row, retry))
-
-            results = await asyncio.gather(*tasks)
-            async with lock:
-                for row, result in zip(current_rows, results):
-                    if result:
-                        writer.writerow(result)
-                    else:
-                        failed_writer.writerow(row)
-                    pbar.update(1)
-
-        await browser.close()
-
-async def process_csv(csv_file, output_file, failed_file, retry=False):
+async def page_slot(pool, slot, task_queue, writer, failed_writer, pbar, retry=False, sink=None, to_item=None):
+    """One tab: take the next row the moment the previous one is done, until the queue is empty."""
+    busy = 0.0
+    while True:
+        try:
+            row = task_queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return busy
+
+        started = time.perf_counter()
+        result = await scrape_row(pool, slot, row, retry)
+        busy += time.perf_counter() - started
+
+        async with lock:
+            if result:
+                writer.writerow(result)
+            else:
+                failed_writer.writerow(row)
+            pbar.update(1)
+        if result and sink is not None and result["name"] not in ("", "N/A") and result["price"] not in ("", "N/A"):
+            try:
+                item = to_item(result)
+            except Exception as e:  # the CSV row is written; prepare_embeddings.py indexes it later
+                print(f"⚠️ Live indexing skipped {result['url']}: {e!r}")
+            else:
+                await sink.put(*item)
+
+def open_browser_pool(p):
+    """One Chromium for the initial and retry passes; contexts/browser recycled on errors or memory."""
+    async def setup(context):
+        await enable_playwright_blocking(context, SITE, block_stats)
+
+    return BrowserPool(
+        p,
+        min(BROWSER_CONTEXTS, CONCURRENT_PAGES),
+        setup=setup if BLOCK_RESOURCES else None,
+        max_rss_mb=MAX_BROWSER_RSS_MB,
+        max_error_rate=MAX_CONTEXT_ERROR_RATE,
+        headless=True,
+    )
+
+async def worker(pool, rows, writer, failed_writer, pbar, retry=False, sink=None, to_item=None):
+    task_queue = asyncio.Queue()
+    for row in rows:
+        task_queue.put_nowait(row)
+
+    # fresh contexts per pass (cookies/cache), same browser process; tabs open on first use
+    await pool.begin_pass()
+    try:
+        slots = min(CONCURRENT_PAGES, len(rows))
+        started = time.perf_counter()
+        busy = await asyncio.gather(
+            *(page_slot(pool, slot, task_queue, writer, failed_writer, pbar, retry, sink, to_item) for slot in range(slots))
+        )
+        elapsed = time.perf_counter() - started
+        if elapsed > 0:
+            print(f"🧵 {slots} page slots over {pool.size} contexts, {sum(busy) / (elapsed * slots):.0%} busy")
+    finally:
+        await pool.end_pass()
+
+async def process_csv(pool, csv_file, output_file, failed_file, retry=False, sink=None, to_item=None):
     if not os.path.exists(csv_file) or os.path.getsize(csv_file) == 0:
         print(f"⚠️ Skipping {csv_file}, missing or empty")
         return
@@ -327,8 +462,6 @@ async def process_csv(csv_file, output_file, failed_file, retry=False):
         print(f"⚠️ No rows in {csv_file}")
         return
 
-    task_queue = reader.copy()
-
     with open(output_file, "a", newline="", encoding="utf-8") as out_f, \
          open(failed_file, "w", newline="", encoding="utf-8") as fail_f:
 
@@ -341,24 +474,52 @@ async def process_csv(csv_file, output_file, failed_file, retry=False):
         failed_writer.writeheader()
 
         pbar = tqdm(total=len(reader), desc=f"Processing {os.path.basename(csv_file)}", ncols=100)
-        await worker(task_queue, writer, failed_writer, pbar, retry)
+        await worker(pool, reader, writer, failed_writer, pbar, retry, sink, to_item)
         pbar.close()
 
-async def main():
-    # 1️⃣ Fast initial pass
-    await process_csv(INPUT_CSV, OUTPUT_CSV, FAILED_CSV, retry=False)
-
-    # 2️⃣ Retry failed URLs with longer waits
-    attempt = 1
-    while os.path.exists(FAILED_CSV) and os.path.getsize(FAILED_CSV) > 0:
-        print(f"\n🔁 Retry attempt {attempt} for failed URLs...")
-        await process_csv(FAILED_CSV, OUTPUT_CSV, FAILED_CSV, retry=True)
-        attempt += 1
-        if attempt > 5:
-            print("⚠️ Max retries reached. Some URLs may still fail.")
-            break
+    if BLOCK_RESOURCES:
+        block_stats.summary()
+    if HTTP_FIRST:
+        http_fetcher.summary()
+
+async def main(args):
+    sink = to_item = None
+    if args.index:
+        sink, to_item = open_live_sink(args)
+        await sink.__aenter__()
+
+    try:
+        async with async_playwright() as p:
+            pool = open_browser_pool(p)
+            try:
+                # 1️⃣ Fast initial pass
+                await process_csv(pool, INPUT_CSV, OUTPUT_CSV, FAILED_CSV, retry=False, sink=sink, to_item=to_item)
+
+                # 2️⃣ Retry failed URLs with longer waits
+                attempt = 1
+                while os.path.exists(FAILED_CSV) and os.path.getsize(FAILED_CSV) > 0:
+                    print(f"\n🔁 Retry attempt {attempt} for failed URLs...")
+                    await process_csv(pool, FAILED_CSV, OUTPUT_CSV, FAILED_CSV, retry=True, sink=sink, to_item=to_item)
+                    attempt += 1
+                    if attempt > 5:
+                        print("⚠️ Max retries reached. Some URLs may still fail.")
+                        break
+            finally:
+                await pool.close()
+    finally:
+        if sink is not None:
+            await sink.close()
 
     print(f"\n🎉 Done! Results → {OUTPUT_CSV}, remaining failed URLs → {FAILED_CSV}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Scrape RareCarat product details (optionally indexing them live)")
+    parser.add_argument("--index", default=None, help="Also encode + index offers into this index while scraping")
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2", help="SentenceTransformer model (with --index)")
+    parser.add_argument("--backend", default="torch", help="Inference backend (with --index)")
+    parser.add_argument("--service-url", default=None, help="Embedding service URL (optional, fallback to .env)")
+    parser.add_argument("--max-in-flight", type=int, default=2, help="Concurrent bulk requests while live indexing")
+    parser.add_argument("--host", default=None, help="Elasticsearch host URL (optional, fallback to .env)")
+    parser.add_argument("--user", default=None, help="Elasticsearch username (optional, fallback to .env)")
+    parser.add_argument("--password", default=None, help="Elasticsearch password (optional, fallback to .env)")
+    asyncio.run(main(parser.parse_args()))
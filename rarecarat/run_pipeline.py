@@ -44,6 +44,11 @@ def main():
         default="urls",
         help="Step to start pipeline from (default: urls)"
     )
+    parser.add_argument(
+        "--live-index",
+        action="store_true",
+        help="Encode + index offers while the details step scrapes (the embeddings step then only writes what changed)"
+    )
     args = parser.parse_args()
 
     # Use password from .env if not provided
@@ -61,7 +66,10 @@ def main():
 
     # Step 2: Fetch details
     if args.start_from in ["urls", "details"]:
-        run_step([sys.executable, "rarecarat/details_from_urls.py"], "Fetching RareCarat product details")
+        cmd = [sys.executable, "rarecarat/details_from_urls.py"]
+        if args.live_index:
+            cmd += ["--index", args.index, "--password", es_password]
+        run_step(cmd, "Fetching RareCarat product details")
 
     # Step 3: Normalize dataset
     if args.start_from in ["urls", "details", "normalize"]: